@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+benchmark.py - Time the build pipeline on synthetic sites and Obsidian vaults
+"""
+
+import io
+import os
+import json
+import time
+import zlib
+import random
+import shutil
+import struct
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+
+from src.build import build_site, sync_content, CONFIG_FILE, TEMPLATES_DIR, CACHE_DIR
+from src.related import RelatedPosts, numpy_available
+from src.search_index import SearchIndex
+from src.utils import render_markdown, find_file_in_vault, load_config, VaultIndex, slugify
+
+BENCHMARK_FILE = os.path.join(CACHE_DIR, "benchmark.json")
+BENCHMARKS = ("build", "render_markdown", "sync", "find_file_in_vault", "search_index", "related_posts", "startup")
+STARTUP_COMMANDS = ("new", "build", "serve")
+STARTUP_TOP_PACKAGES = 5
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SEARCH_POST_COUNTS = (10, 100, 1000)
+SEARCH_VOCABULARY_SIZE = 20000
+SEARCH_POST_WORDS = 1000
+RELATED_POST_COUNTS = (10, 100, 500)
+RELATED_TAGS = 20
+STATIC_DIR = "static"
+
+WORDS = (
+    "vector matrix basis span kernel image rank eigenvalue projection orthogonal linear space dimension "
+    "transform inner product norm subspace determinant inverse gradient tensor field scalar column row"
+).split()
+CODE_SNIPPET = '''```python
+def project(u, v):
+    """Project u onto v"""
+    scale = sum(a * b for a, b in zip(u, v)) / sum(b * b for b in v)
+    return [scale * b for b in v]
+```'''
+INLINE_MATH = r"$\mathbf{{v}}_{0} \cdot \mathbf{{w}} = \sum_i v_i w_i$"
+DISPLAY_MATH = r"""$$
+\mathrm{{proj}}_{{\mathbf{{w}}}}(\mathbf{{v}}_{0}) = \frac{{\mathbf{{v}} \cdot \mathbf{{w}}}}{{\|\mathbf{{w}}\|^2}}\mathbf{{w}}
+$$"""
+
+
+def write_png(path, width, height, seed):
+    """Write a small RGB gradient PNG (no Pillow needed)"""
+    rows = b"".join(
+        b"\x00" + bytes(channel for x in range(width) for channel in (x * 255 // width, y * 255 // height, seed % 256))
+        for y in range(height)
+    )
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(path, 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows)))
+        f.write(chunk(b"IEND", b""))
+
+def paragraph(rng, words=60):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def synthetic_body(rng, index, math, code, images, image_link):
+    """
+    Markdown body of one synthetic post.
+
+    `math` expressions (alternating inline and display), `code` fenced blocks
+    and `images` image references are spread between plain paragraphs.
+    """
+    blocks = [paragraph(rng) for _ in range(max(3, math + code + images))]
+
+    for i in range(math):
+        expression = (INLINE_MATH if i % 2 == 0 else DISPLAY_MATH).format(i)
+        if i % 2 == 0:
+            blocks[i % len(blocks)] += f" Inline {expression} in text."
+        else:
+            blocks.insert(rng.randrange(len(blocks) + 1), expression)
+
+    for _ in range(code):
+        blocks.insert(rng.randrange(len(blocks) + 1), CODE_SNIPPET)
+
+    for i in range(images):
+        blocks.insert(rng.randrange(len(blocks) + 1), image_link(f"figure-{index}-{i}.png", i))
+
+    return "\n\n".join(blocks) + "\n"
+
+def post_tags(rng, tags, tag_pool):
+    return rng.sample(tag_pool, min(tags, len(tag_pool)))
+
+def frontmatter_block(title, date, tags):
+    tag_lines = "".join(f"  - {tag}\n" for tag in tags)
+    return f"---\ntitle: {title}\nDate: {date}\ntags:\n{tag_lines}---\n\n" if tags else \
+        f"---\ntitle: {title}\nDate: {date}\n---\n\n"
+
+def post_date(index):
+    return f"20{10 + index % 15:02d}-{1 + index % 12:02d}-{1 + index % 28:02d}"
+
+def generate_site(root, posts=100, math=6, code=2, tags=3, images=1, seed=0):
+    """
+    Create a synthetic site (site.toml, templates, static files and content) in `root`.
+
+    Posts go to content/blog/<slug>/index.md with their images next to them
+    in assets/. Returns the markdown bodies of the posts.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+
+    shutil.copytree(TEMPLATES_DIR, root / TEMPLATES_DIR)
+    shutil.copytree(STATIC_DIR, root / STATIC_DIR)
+
+    config = Path(CONFIG_FILE).read_text(encoding='utf-8')
+    (root / CONFIG_FILE).write_text(config.replace("[sync]", "[unused-sync]"), encoding='utf-8')
+
+    content_dir = root / "content"
+    blog_dir = content_dir / "blog"
+    blog_dir.mkdir(parents=True)
+    (content_dir / "_index.md").write_text("---\ntitle: Home\n---\n\nSynthetic benchmark site.\n", encoding='utf-8')
+    (content_dir / "about.md").write_text("---\ntitle: About\n---\n\n" + paragraph(rng) + "\n", encoding='utf-8')
+    (blog_dir / "_index.md").write_text("---\ntitle: Blog\n---\n", encoding='utf-8')
+
+    tag_pool = [f"topic {i}" for i in range(max(10, posts // 5))]
+    bodies = []
+
+    for index in range(posts):
+        title = f"Post {index} {rng.choice(WORDS)}"
+        post_dir = blog_dir / slugify(title)
+        (post_dir / "assets").mkdir(parents=True)
+
+        for i in range(images):
+            write_png(post_dir / "assets" / f"figure-{index}-{i}.png", 96, 64, index + i)
+
+        body = synthetic_body(
+            rng, index, math, code, images,
+            lambda name, i: f"![Figure {i}|{300 + 20 * i}](assets/{name})"
+        )
+        bodies.append(body)
+        (post_dir / "index.md").write_text(
+            frontmatter_block(title, post_date(index), post_tags(rng, tags, tag_pool)) + body,
+            encoding='utf-8'
+        )
+
+    return bodies
+
+def generate_vault(root, notes=100, attachments=500, math=6, code=2, tags=3, images=2, seed=0):
+    """
+    Create a synthetic Obsidian vault in `root`.
+
+    Attachments are spread across nested folders (as in a real vault) and
+    notes in Blog/ embed random ones with ![[name]] / ![[name|width]].
+    Returns (blog folder, attachment names).
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    (root / ".obsidian").mkdir(parents=True)
+    (root / ".obsidian" / "app.json").write_text("{}", encoding='utf-8')
+
+    names = []
+    for i in range(attachments):
+        folder = root / "Attachments" / f"{i % 10:02d}" / f"{i % 7:02d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        name = f"Pasted image {i:05d}.png"
+        write_png(folder / name, 32, 24, i)
+        names.append(name)
+
+    # Unrelated notes make the vault look like a real one to directory scans
+    for i in range(notes):
+        folder = root / "Journal" / f"{i % 12:02d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"Day {i}.md").write_text(paragraph(rng) + "\n", encoding='utf-8')
+
+    blog_dir = root / "Blog"
+    blog_dir.mkdir()
+    tag_pool = [f"topic {i}" for i in range(max(10, notes // 5))]
+
+    for index in range(notes):
+        body = synthetic_body(
+            rng, index, math, code, images,
+            lambda name, i: f"![[{rng.choice(names)}|{300 + 20 * i}]]" if i % 2 else f"![[{rng.choice(names)}]]"
+        )
+        (blog_dir / f"Note {index}.md").write_text(
+            frontmatter_block(f"Note {index}", post_date(index), post_tags(rng, tags, tag_pool)) + body,
+            encoding='utf-8'
+        )
+
+    return blog_dir, names
+
+def vocabulary(size, seed=0):
+    """Pseudo-words for search benchmarks (the prose generator only knows a few dozen words)"""
+    rng = random.Random(seed)
+    syllables = [consonant + vowel for consonant in "bcdfghklmnprstvz" for vowel in "aeiou"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+def synthetic_posts(count, words=SEARCH_POST_WORDS, vocabulary_size=SEARCH_VOCABULARY_SIZE, seed=0):
+    """Rendered posts whose words follow a Zipf distribution, as in natural text"""
+    rng = random.Random(seed)
+    terms = vocabulary(vocabulary_size, seed)
+    cumulative = []
+    total = 0.0
+    for rank in range(len(terms)):
+        total += 1 / (rank + 1)
+        cumulative.append(total)
+
+    posts = []
+    for index in range(count):
+        text = " ".join(rng.choices(terms, cum_weights=cumulative, k=words))
+        posts.append({
+            'title': f"Post {index}",
+            'url': f"/blog/post-{index}/",
+            'date': datetime.date(2010, 1, 1) + datetime.timedelta(days=index),
+            'content': f"<p>{text}</p>"
+        })
+    return posts
+
+@contextmanager
+def working_directory(path):
+    """Run the build code (which uses paths relative to the site root) inside `path`"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def measure(func, repeat, setup=None):
+    """Run func `repeat` times (after setup, which is not timed), returning timing stats"""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+
+    return {
+        'runs': runs,
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'max': max(runs)
+    }
+
+def clear(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+def bench_build(site_dir, repeat, jobs):
+    """Cold build (empty caches), warm build (caches filled) and no-op incremental build"""
+    with working_directory(site_dir):
+        with redirect_stdout(io.StringIO()):
+            build_site(jobs=jobs)  # Warm up imports and the filesystem cache
+        return {
+            'build_cold': measure(lambda: build_site(jobs=jobs), repeat, setup=lambda: clear("public", CACHE_DIR)),
+            'build_warm': measure(lambda: build_site(jobs=jobs), repeat),
+            'build_incremental': measure(lambda: build_site(incremental=True, jobs=jobs), repeat)
+        }
+
+def bench_render_markdown(bodies, repeat):
+    """Render every synthetic post body without the markdown cache"""
+    return {
+        'render_markdown': measure(lambda: [render_markdown(body) for body in bodies], repeat)
+    }
+
+def bench_sync(site_dir, vault_blog, repeat):
+    """Full sync (no previous state) and no-op incremental sync of the synthetic vault"""
+    with working_directory(site_dir):
+        config_path = Path(CONFIG_FILE)
+        config_path.write_text(
+            config_path.read_text(encoding='utf-8') + f'\n[sync]\ntype = "obsidian"\npath = {json.dumps(str(vault_blog))}\n',
+            encoding='utf-8'
+        )
+        config = load_config(CONFIG_FILE)
+
+        return {
+            'sync_full': measure(
+                lambda: sync_content(config), repeat, setup=lambda: clear(os.path.join("content", "blog"), CACHE_DIR)
+            ),
+            'sync_incremental': measure(lambda: sync_content(config), repeat)
+        }
+
+def bench_find_file(vault_blog, names, repeat, lookups=200, unindexed_lookups=20):
+    """Attachment lookups through the vault index, and through the vault-wide glob fallback"""
+    vault_root = vault_blog.parent
+    source_file = vault_blog / "Note 0.md"
+    rng = random.Random(1)
+    queries = [rng.choice(names) for _ in range(lookups)]
+    queries += [name.upper() for name in queries[:lookups // 10]]  # Case-insensitive matches
+
+    def build_index():
+        index = VaultIndex(vault_root)
+        index.refresh()
+        return index
+
+    vault_index = build_index()
+
+    return {
+        'vault_index_build': measure(build_index, repeat),
+        'find_file_in_vault_indexed': measure(
+            lambda: [find_file_in_vault(name, source_file, vault_index) for name in queries], repeat
+        ),
+        'find_file_in_vault_glob': measure(
+            lambda: [find_file_in_vault(name, source_file) for name in queries[:unindexed_lookups]], repeat
+        )
+    }
+
+def bench_search_index(post_counts, repeat):
+    """Build time and output size of the search index as the number of posts grows"""
+    results = {}
+    for count in post_counts:
+        posts = synthetic_posts(count)
+        result = measure(lambda: SearchIndex.from_posts(posts).outputs("public"), repeat)
+
+        sizes = [len(text.encode('utf-8')) for _, text in SearchIndex.from_posts(posts).outputs("public")]
+        result.update({
+            'posts': count,
+            'shards': len(sizes) - 1,
+            'bytes': sum(sizes),
+            'meta_bytes': sizes[0],
+            'largest_shard_bytes': max(sizes[1:], default=0)
+        })
+        results[f"search_index_{count}"] = result
+    return results
+
+def import_times(code):
+    """
+    Run `code` in a fresh interpreter under `python -X importtime`.
+
+    Returns [(module, depth, self microseconds, cumulative microseconds)] in
+    the order the modules finished importing.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+def bench_startup(repeat, commands=STARTUP_COMMANDS):
+    """
+    Startup cost of every CLI command: wall time of a fresh interpreter that loads
+    the command (without running it), plus an importtime breakdown by top-level package.
+    """
+    results = {}
+    for name in commands:
+        code = f"import src.cli; src.cli.load_command({name!r})"
+        result = measure(lambda: subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True), repeat)
+
+        packages = {}
+        imports = import_times(code)
+        for module, _, self_us, _ in imports:
+            package = module.split(".")[0]
+            packages[package] = packages.get(package, 0) + self_us
+
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:STARTUP_TOP_PACKAGES]
+        result.update({
+            'command': name,
+            'modules': len(imports),
+            'import_ms': sum(self_us for _, _, self_us, _ in imports) / 1000,
+            'heaviest': [[package, self_us / 1000] for package, self_us in heaviest]
+        })
+        results[f"startup_{name}"] = result
+    return results
+
+def bench_related_posts(post_counts, repeat, tags=3):
+    """Time to vectorize the posts and rank the related posts of each one, as the number of posts grows"""
+    results = {}
+    for count in post_counts:
+        posts = synthetic_posts(count)
+        rng = random.Random(0)
+        for post in posts:
+            post['metadata'] = {'tags': rng.sample([f"tag-{index}" for index in range(RELATED_TAGS)], tags)}
+
+        result = measure(lambda: RelatedPosts.from_posts(posts).related(), repeat)
+        result.update({'posts': count, 'numpy': numpy_available()})
+        results[f"related_posts_{count}"] = result
+    return results
+
+def git_commit():
+    """Current commit of the repository (None outside a git checkout)"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def run_benchmarks(params, selected=BENCHMARKS, repeat=3, jobs=1, keep=False, search_posts=SEARCH_POST_COUNTS):
+    """Generate the synthetic corpus, run the selected benchmarks and return the results"""
+    work_dir = Path(tempfile.mkdtemp(prefix="microblog-bench-"))
+    results = {}
+
+    try:
+        print(f"Generating synthetic site and vault in {work_dir}")
+        site_dir = work_dir / "site"
+        bodies = []
+        if "build" in selected or "render_markdown" in selected:
+            bodies = generate_site(
+                site_dir, params['posts'], params['math'], params['code'], params['tags'], params['images']
+            )
+
+        vault_blog, names = None, []
+        if "sync" in selected or "find_file_in_vault" in selected:
+            vault_blog, names = generate_vault(
+                work_dir / "vault", params['notes'], params['attachments'],
+                params['math'], params['code'], params['tags'], params['images']
+            )
+
+        if "build" in selected:
+            print("Benchmarking build_site...")
+            results.update(bench_build(site_dir, repeat, jobs))
+        if "render_markdown" in selected:
+            print("Benchmarking render_markdown...")
+            results.update(bench_render_markdown(bodies, repeat))
+        if "sync" in selected:
+            print("Benchmarking sync_content...")
+            sync_dir = work_dir / "sync-site"
+            generate_site(sync_dir, posts=0)
+            results.update(bench_sync(sync_dir, vault_blog, repeat))
+        if "find_file_in_vault" in selected:
+            print("Benchmarking find_file_in_vault...")
+            results.update(bench_find_file(vault_blog, names, repeat))
+        if "search_index" in selected:
+            print("Benchmarking the search index...")
+            results.update(bench_search_index(search_posts, repeat))
+        if "related_posts" in selected:
+            print("Benchmarking related posts...")
+            results.update(bench_related_posts(RELATED_POST_COUNTS, repeat))
+        if "startup" in selected:
+            print("Benchmarking command startup...")
+            results.update(bench_startup(repeat))
+    finally:
+        if keep:
+            print(f"Kept benchmark files in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'jobs': jobs,
+        'repeat': repeat,
+        'params': params,
+        'results': results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the site generator on a synthetic corpus")
+    parser.add_argument("--posts", type=int, default=100, help="number of synthetic posts (default: 100)")
+    parser.add_argument("--math", type=int, default=6, help="math expressions per post (default: 6)")
+    parser.add_argument("--code", type=int, default=2, help="code blocks per post (default: 2)")
+    parser.add_argument("--tags", type=int, default=3, help="tags per post (default: 3)")
+    parser.add_argument("--images", type=int, default=1, help="images per post (default: 1)")
+    parser.add_argument("--notes", type=int, default=100, help="notes in the synthetic vault (default: 100)")
+    parser.add_argument("--attachments", type=int, default=500, help="attachments in the synthetic vault (default: 500)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (default: 3)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="worker processes for build_site (default: 1)")
+    parser.add_argument("--only", choices=BENCHMARKS, action="append", help="run only these benchmarks")
+    parser.add_argument("--output", "-o", default=BENCHMARK_FILE, help=f"JSON results file (default: {BENCHMARK_FILE})")
+    parser.add_argument(
+        "--search-posts", type=lambda value: [int(count) for count in value.split(",")],
+        default=list(SEARCH_POST_COUNTS), metavar="N,N,...",
+        help="post counts of the search index size benchmark (default: 10,100,1000)"
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the generated site and vault")
+    args = parser.parse_args()
+
+    params = {
+        'posts': args.posts,
+        'math': args.math,
+        'code': args.code,
+        'tags': args.tags,
+        'images': args.images,
+        'notes': args.notes,
+        'attachments': args.attachments
+    }
+    report = run_benchmarks(params, args.only or BENCHMARKS, args.repeat, args.jobs, args.keep, args.search_posts)
+
+    print(f"\n{'benchmark':<30} {'min':>9} {'median':>9} {'max':>9}")
+    for name, result in report['results'].items():
+        print(f"{name:<30} {result['min']:>8.3f}s {result['median']:>8.3f}s {result['max']:>8.3f}s")
+
+    sizes = [result for result in report['results'].values() if 'bytes' in result]
+    if sizes:
+        print(f"\n{'search index':<14} {'shards':>7} {'total':>11} {'per post':>10} {'largest shard':>14}")
+        for result in sizes:
+            print(f"{result['posts']:>8} posts {result['shards']:>7} {result['bytes'] / 1024:>9.1f}KB "
+                  f"{result['bytes'] / result['posts'] / 1024:>8.2f}KB {result['largest_shard_bytes'] / 1024:>12.1f}KB")
+
+    startup = [result for result in report['results'].values() if 'import_ms' in result]
+    if startup:
+        print(f"\n{'startup':<8} {'modules':>8} {'imports':>10}  heaviest packages")
+        for result in startup:
+            heaviest = ", ".join(f"{package} {ms:.1f}ms" for package, ms in result['heaviest'])
+            print(f"{result['command']:<8} {result['modules']:>8} {result['import_ms']:>8.1f}ms  {heaviest}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
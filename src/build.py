@@ -5,36 +5,89 @@ build.py - Minimal static site generator that reads Markdown files and converts
 
 import os
 import json
+import time
 import shutil
-import frontmatter
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from datetime import datetime
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
 
+from src import profiler
+from src.cache import DiskCache
+from src.compress import compress_outputs, compression_summary
+from src.environment import SiteEnvironment
+from src.fingerprint import (
+    fingerprint_assets, asset_urls, asset_filter, rewrite_asset_urls, write_asset_manifest
+)
+from src.images import optimize_images, responsive_images
+from src.manifest import BuildManifest
+from src.minify import minify_html, minify_css, MINIFY_VERSION
+from src.page import Page, read_frontmatter, content_digest, rendering_once, to_json
+from src.related import RelatedPosts, DEFAULT_RELATED_POSTS
+from src.search_index import (
+    index_outputs, render_index, render_shard, shard_path, post_entry, term_vector, SearchIndex, INDEX_FILE
+)
+from src.staging import clone_tree, restore_unchanged, publish
 from src.utils import (
-    render_markdown, slugify, ensure_dir, copy_files, generate_url, generate_sitemap, load_config, process_assets,
-    create_blog_index
+    slugify, ensure_dir, copy_files, generate_url, generate_sitemap, load_config, process_assets,
+    create_blog_index, write_file, hash_data, hash_file, find_vault_root, find_file_in_vault, VaultIndex, LINK_MODES,
+    paginate, render_sitemap
 )
 
 # Configuration
 CONTENT_DIR = "content"
 PUBLIC_DIR = "public"
+STAGING_DIR = PUBLIC_DIR + ".staging"  # next to public/, so it can be renamed into place
 TEMPLATES_DIR = "templates"
 CONFIG_FILE = "site.toml"
+CACHE_DIR = ".cache"
+PROFILE_FILE = os.path.join(CACHE_DIR, "profile.json")
+MANIFEST_FILE = os.path.join(CACHE_DIR, "manifest.json")
+SYNC_STATE_FILE = os.path.join(CACHE_DIR, "sync.json")
+SYNC_STATE_VERSION = 2
+VAULT_INDEX_FILE = os.path.join(CACHE_DIR, "vault-index.json")
+MARKDOWN_CACHE_DIR = os.path.join(CACHE_DIR, "markdown")
+MARKDOWN_CACHE_SIZE = 64 * 1024 * 1024  # bytes
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+IMAGE_CACHE_SIZE = 512 * 1024 * 1024  # bytes
+MINIFY_CACHE_DIR = os.path.join(CACHE_DIR, "minify")
+MINIFY_CACHE_SIZE = 64 * 1024 * 1024  # bytes
+COMPRESS_CACHE_DIR = os.path.join(CACHE_DIR, "compress")
+COMPRESS_CACHE_SIZE = 256 * 1024 * 1024  # bytes
+TEMPLATE_CACHE_DIR = os.path.join(CACHE_DIR, "templates")
+TERM_CACHE_DIR = os.path.join(CACHE_DIR, "terms")
+TERM_CACHE_SIZE = 16 * 1024 * 1024  # bytes
 DEFAULT_LAYOUT = "page.html"
 POST_LAYOUT = "post.html"
 LIST_LAYOUT = "list.html"
 HOME_LAYOUT = "home.html"
-
-def copy_static_files():
-    """Copy static files to public directory"""
-    return copy_files("static", PUBLIC_DIR)
-
-def copy_content_assets():
+RENDER_CHUNK_SIZE = 32  # outputs per render task
+RENDER_WINDOW = 4       # render tasks in flight per worker
+
+def copy_static_files(link_mode="copy", minify_cache=None, output_dir=PUBLIC_DIR):
+    """Copy static files to public directory (stylesheets are minified when a `minify_cache` is given)"""
+    if minify_cache is None:
+        return copy_files("static", output_dir, link_mode=link_mode)
+
+    copied = copy_files("static", output_dir, exclude_patterns=["**/*.css"], link_mode=link_mode)
+    for css_file in sorted(Path("static").glob("**/*.css")):
+        output_path = Path(output_dir) / css_file.relative_to("static")
+        css = minify_css(css_file.read_text(encoding='utf-8'), minify_cache)
+
+        # Only rewrite stylesheets whose minified text changed
+        if not (output_path.exists() and output_path.read_text(encoding='utf-8') == css):
+            write_file(output_path, css)
+        copied.append(output_path)
+    return copied
+
+def copy_content_assets(link_mode="copy", output_dir=PUBLIC_DIR):
     """Copy non-markdown files from content folders to public output"""
     return copy_files(
-        CONTENT_DIR, PUBLIC_DIR,
-        exclude_patterns=["**/*.md", "**/*.markdown", "**/.*/**"]
+        CONTENT_DIR, output_dir,
+        exclude_patterns=["**/*.md", "**/*.markdown", "**/.*/**"],
+        link_mode=link_mode
     )
 
 def get_nav_pages(pages):
@@ -70,95 +123,148 @@ def get_nav_pages(pages):
     nav_pages.sort(key=lambda x: x['weight'])
     return nav_pages
 
-def process_content():
-    """Process all markdown files in content directory"""
-    pages = []
-    posts = []
-    sections = {}
-    tags = {}
+def is_content_file(md_file):
+    """Check whether a markdown file is built into a page"""
+    # Skip files in hidden folders
+    if any(part.startswith('.') for part in md_file.parts):
+        return False
 
+    # Skip drafts if draft mode is not enabled
+    if md_file.stem.startswith('_') and md_file.stem != '_index':
+        return False
+
+    return True
+
+def find_content_files():
+    """List the markdown files to build, in a stable order"""
+    return sorted(md_file for md_file in Path(CONTENT_DIR).glob("**/*.md") if is_content_file(md_file))
+
+def load_page(md_file, markdown_cache=None, output_dir=PUBLIC_DIR):
+    """Read the frontmatter of a markdown file into a page object (the body is rendered on access, see page.py)"""
     content_path = Path(CONTENT_DIR)
 
-    # Find all markdown files
-    for md_file in content_path.glob("**/*.md"):
-        # Skip files in hidden folders
-        if any(part.startswith('.') for part in md_file.parts):
-            continue
+    # Check if this is a blog post (in the blog directory)
+    is_post = "blog" in md_file.parts and md_file.stem != '_index'
+
+    # Check if this is an index file
+    is_index = md_file.stem == '_index'
+
+    # Check if this is a content index file (index.md in a content folder)
+    is_content_index = md_file.stem == 'index'
+
+    # Get directory level (0 = directly in content)
+    level = len(md_file.relative_to(content_path).parts) - 1
+
+    # Parse the frontmatter block only
+    with profiler.step("parse", md_file):
+        metadata = read_frontmatter(md_file)
+
+    # Extract or generate metadata
+    title = metadata.get('title', md_file.stem.replace('-', ' ').title())
+    date = metadata.get('Date', datetime.fromtimestamp(md_file.stat().st_mtime).date())
+
+    # Generate slug if not provided
+    slug = metadata.get('slug', slugify(title) if not is_index else '')
+
+    # Determine URL path and output path
+    rel_path = md_file.relative_to(content_path).parent
+    url, output_path = generate_url(rel_path, output_dir, is_index, is_content_index, slug)
+
+    # Determine layout template
+    layout = metadata.get('layout', None)
+    if layout is None:
+        if is_index:
+            layout = HOME_LAYOUT if rel_path == Path('') else LIST_LAYOUT
+        elif is_post:
+            layout = POST_LAYOUT
+        else:
+            layout = DEFAULT_LAYOUT
+
+    return Page({
+        'title': title,
+        'date': date,
+        'date_formatted': date.strftime("%d %b, %Y"),
+        'content_digest': content_digest(md_file),
+        'url': url,
+        'output_path': output_path,
+        'source_path': md_file,
+        'metadata': metadata,
+        'is_post': is_post,
+        'is_index': is_index,
+        'section': rel_path.parts[0] if rel_path != Path('') else None,
+        'level': level,
+        'layout': layout
+    }, markdown_cache)
+
+# Per-process state of the worker pools
+_worker_cache = None
+_worker_output_dir = PUBLIC_DIR
+_worker_env = None
+_worker_context = None
+_worker_minify_cache = None
+
+def _init_load_worker(markdown_cache, output_dir):
+    global _worker_cache, _worker_output_dir
+    _worker_cache = markdown_cache
+    _worker_output_dir = output_dir
+
+def _load_page_job(md_file):
+    """
+    Load a page in a worker, returning it with the worker's cache hits/misses for that page.
+
+    The body is rendered once into the shared markdown cache (and dropped), so
+    the main process only reads it back when it needs the HTML.
+    """
+    if _worker_cache is None:
+        return load_page(md_file, output_dir=_worker_output_dir), 0, 0
+
+    hits, misses = _worker_cache.hits, _worker_cache.misses
+    page_obj = load_page(md_file, _worker_cache, _worker_output_dir)
+    page_obj.render()
+    return page_obj, _worker_cache.hits - hits, _worker_cache.misses - misses
+
+def load_pages(content_files, markdown_cache=None, jobs=1, output_dir=PUBLIC_DIR):
+    """
+    Load pages serially or across a process pool, preserving input order.
+
+    Serially, only the frontmatter is read and bodies are rendered when first
+    accessed. A pool also pre-renders the bodies into the markdown cache.
+    """
+    if jobs <= 1 or len(content_files) <= 1 or markdown_cache is None:
+        return [load_page(md_file, markdown_cache, output_dir) for md_file in content_files]
 
-        # Skip drafts if draft mode is not enabled
-        if md_file.stem.startswith('_') and md_file.stem != '_index':
-            continue
+    pages = []
+    with ProcessPoolExecutor(jobs, initializer=_init_load_worker, initargs=(markdown_cache, output_dir)) as pool:
+        for page_obj, hits, misses in pool.map(_load_page_job, content_files, chunksize=_chunksize(content_files, jobs)):
+            page_obj.markdown_cache = markdown_cache
+            pages.append(page_obj)
+            markdown_cache.merge_stats(hits, misses)
 
-        # Check if this is a blog post (in the blog directory)
-        is_post = "blog" in md_file.parts and md_file.stem != '_index'
-
-        # Check if this is an index file
-        is_index = md_file.stem == '_index'
-
-        # Check if this is a content index file (index.md in a content folder)
-        is_content_index = md_file.stem == 'index'
-
-        # Get directory level (0 = directly in content)
-        level = len(md_file.relative_to(content_path).parts) - 1
-
-        # Parse frontmatter and content
-        page = frontmatter.load(str(md_file))
-
-        # Extract or generate metadata
-        title = page.get('title', md_file.stem.replace('-', ' ').title())
-        date = page.get('Date', datetime.fromtimestamp(md_file.stat().st_mtime).date())
-
-        # Generate slug if not provided
-        slug = page.get('slug', slugify(title) if not is_index else '')
-
-        # Determine URL path and output path
-        rel_path = md_file.relative_to(Path(CONTENT_DIR)).parent
-        url, output_path = generate_url(rel_path, PUBLIC_DIR, is_index, is_content_index, slug)
-
-        # Determine layout template
-        layout = page.get('layout', None)
-        if layout is None:
-            if is_index:
-                layout = HOME_LAYOUT if rel_path == Path('') else LIST_LAYOUT
-            elif is_post:
-                layout = POST_LAYOUT
-            else:
-                layout = DEFAULT_LAYOUT
-
-        page_obj = {
-            'title': title,
-            'date': date,
-            'date_formatted': date.strftime("%d %b, %Y"),
-            'content': render_markdown(page.content),
-            'url': url,
-            'output_path': output_path,
-            'metadata': page.metadata,
-            'is_post': is_post,
-            'is_index': is_index,
-            'section': rel_path.parts[0] if rel_path != Path('') else None,
-            'level': level,
-            'layout': layout
-        }
+    return pages
+
+def _chunksize(items, jobs):
+    """Hand out work in a few chunks per worker to amortize IPC overhead"""
+    return max(1, len(items) // (jobs * 4))
+
+def collect_content(pages):
+    """
+    Build the site collections (posts, sections, tags, nav) from loaded pages.
+
+    This is a serial reduce over the pages in file order, so the result does
+    not depend on how (or in how many processes) the pages were loaded.
+    """
+    posts = []
+    sections = {}
+    tags = {}
+
+    for page_obj in pages:
+        is_post = page_obj['is_post']
+        rel_path = page_obj['source_path'].relative_to(Path(CONTENT_DIR)).parent
 
         # Add to appropriate lists
-        pages.append(page_obj)
         if is_post:
             posts.append(page_obj)
 
-            post_tags = page.get('tags', [])
-            if post_tags:
-                for tag in post_tags:
-                    tag_slug = slugify(tag)
-                    if tag_slug not in tags:
-                        tags[tag_slug] = {
-                            'name': tag,
-                            'slug': tag_slug,
-                            'count': 0,
-                            'posts': []
-                        }
-                    tags[tag_slug]['count'] += 1
-                    tags[tag_slug]['posts'].append(page_obj)
-
         # Build section data
         if rel_path != Path('') and not is_post:
             section = rel_path.parts[0]
@@ -168,22 +274,314 @@ def process_content():
     # Sort posts by date, newest first
     posts.sort(key=lambda x: x['date'], reverse=True)
 
-    # Group posts by section
+    # Group posts by section and tag (both lists inherit the date order)
     for post in posts:
         section = post['section']
         if section in sections:
             sections[section].append(post)
 
+        post_tags = post['metadata'].get('tags', [])
+        if post_tags:
+            for tag in post_tags:
+                tag_slug = slugify(tag)
+                if tag_slug not in tags:
+                    tags[tag_slug] = {
+                        'name': tag,
+                        'slug': tag_slug,
+                        'count': 0,
+                        'posts': []
+                    }
+                tags[tag_slug]['count'] += 1
+                tags[tag_slug]['posts'].append(post)
+
     return {
-        'pages': pages,
+        'pages': list(pages),
         'posts': posts,
         'sections': sections,
         'nav': get_nav_pages(pages),
         'tags': tags
     }
 
+def process_content(markdown_cache=None, jobs=1, output_dir=PUBLIC_DIR):
+    """Process all markdown files in content directory (parsing and rendering fan out across `jobs` processes)"""
+    return collect_content(load_pages(find_content_files(), markdown_cache, jobs, output_dir))
+
+def apply_image_variants(page, image_variants, output_dir=PUBLIC_DIR):
+    """Serve a page's optimized images through <picture>/srcset"""
+    if image_variants:
+        page.add_transform(responsive_images, page['output_path'].parent, image_variants, output_dir)
+
+def apply_fingerprints(page, fingerprints, output_dir=PUBLIC_DIR):
+    """Point a page's asset references at their fingerprinted files"""
+    if fingerprints:
+        page.add_transform(rewrite_asset_urls, page['output_path'].parent, fingerprints, output_dir)
+
+def page_asset_inputs(pages, image_variants, fingerprints, static_fingerprints, output_dir=PUBLIC_DIR):
+    """
+    Group the image variants and fingerprints that can change rendered bodies by page.
+
+    A content asset belongs to the page with the nearest output directory
+    above it (a post and its assets/ folder); fingerprinted static files
+    belong to every page. Returns {page output directory: assets}, with paths
+    relative to `output_dir` so staged and in-place builds hash the same.
+    """
+    page_dirs = {page['output_path'].parent for page in pages}
+    shared = {os.path.relpath(path, output_dir): target for path, target in static_fingerprints.items()}
+    grouped = {page_dir: {'images': {}, 'fingerprints': dict(shared)} for page_dir in page_dirs}
+
+    def owner(path):
+        return next((parent for parent in Path(path).parents if parent in page_dirs), None)
+
+    for kind, assets in (('images', image_variants), ('fingerprints', fingerprints)):
+        for path, value in assets.items():
+            page_dir = owner(path)
+            if page_dir is not None and path not in static_fingerprints:
+                grouped[page_dir][kind][os.path.relpath(path, output_dir)] = value
+
+    return grouped
+
+def related_posts_count(config):
+    """Number of related posts listed under each post (`related_posts` in [params], 0 to disable)"""
+    return config.get("params", {}).get("related_posts", DEFAULT_RELATED_POSTS)
+
+def apply_related_posts(content, related_posts, top):
+    """Give every post a `related` list with the title, URL and date of its most similar posts"""
+    posts = {post['url']: post for post in content['posts']}
+    for url, related in related_posts.related(top).items():
+        posts[url]['related'] = [
+            {'title': posts[other]['title'], 'url': other, 'date_formatted': posts[other]['date_formatted']}
+            for other, _ in related
+        ]
+
+def build_context(config, content, asset_urls=None):
+    """Build the template context shared by every page"""
+    # Add current year for copyright
+    config["current_year"] = datetime.now().year
+
+    return {
+        "site": config,
+        "pages": content['pages'],
+        "posts": content['posts'],
+        "sections": content['sections'],
+        "nav": content['nav'],
+        "tags": content['tags'],
+        "asset_urls": asset_urls or {}
+    }
+
+def site_outputs(env, config, content, output_dir=PUBLIC_DIR):
+    """
+    Yield every rendered output as (template name, context overrides, output path, source file).
+
+    Overrides only hold what differs per output (the page, its slice of posts
+    and pagination); everything else comes from the shared context.
+    """
+    posts_per_page = config.get("params", {}).get("posts_per_page")
+
+    # Render all pages
+    for page in content['pages']:
+        page_overrides = {"page": page}
+
+        # For section pages, add section-specific posts (one output per page of posts)
+        if page['is_index'] and page['section']:
+            section_posts = content['sections'].get(page['section'], [])
+            for pagination in paginate(section_posts, posts_per_page, page['url'], page['output_path'].parent):
+                output_path = pagination.pop('output_path')
+                page_overrides["section_posts"] = pagination.pop('posts')
+                page_overrides["pagination"] = pagination
+                yield page['layout'], dict(page_overrides), output_path, page['source_path']
+            continue
+
+        yield page['layout'], page_overrides, page['output_path'], page['source_path']
+
+    # Generate tag pages for the blog
+    if "blog" in content['sections'] and content['tags']:
+        # Create a tag page for each tag
+        for tag_slug, tag_data in content['tags'].items():
+            tag_dir = Path(output_dir) / "blog" / tag_slug
+
+            for pagination in paginate(tag_data['posts'], posts_per_page, f"/blog/{tag_slug}/", tag_dir):
+                output_path = pagination.pop('output_path')
+
+                # Create page context
+                tag_overrides = {
+                    "page": {
+                        'is_index': True,
+                        'section': 'blog',
+                        'is_tag_page': True,
+                        'tag': tag_data['name'],
+                        'tag_slug': tag_slug
+                    },
+                    "section_posts": pagination.pop('posts'),
+                    "pagination": pagination,
+                    "is_filtered": True,
+                    "current_tag": tag_data['name']
+                }
+                yield LIST_LAYOUT, tag_overrides, output_path, None
+
+    # Create 404 page
+    if env.has_template("404.html"):
+        yield "404.html", {}, Path(output_dir) / "404.html", None
+
+def create_environment():
+    """Create the Jinja environment used to render templates (compiled templates are cached on disk)"""
+    env = SiteEnvironment(TEMPLATES_DIR, TEMPLATE_CACHE_DIR)
+
+    # Add custom filters
+    env.filters['slugify'] = slugify
+    env.filters['asset'] = asset_filter
+
+    return env
+
+def _init_render_worker(context, minify_cache):
+    global _worker_env, _worker_context, _worker_minify_cache
+    _worker_env = create_environment()
+    _worker_context = context
+    _worker_minify_cache = minify_cache
+
+def _cache_counts(caches):
+    """Total (hits, misses) of some caches"""
+    return sum(cache.hits for cache in caches), sum(cache.misses for cache in caches)
+
+def _render_chunk(chunk):
+    """
+    Render a chunk of jobs in a worker.
+
+    Returns the (output path, html) results with the markdown and minify
+    cache hits/misses of the chunk, as (hits, misses) pairs. The pages of a
+    chunk arrive with their own copy of the markdown cache.
+    """
+    markdown_caches = list({
+        id(cache): cache
+        for cache in (getattr(overrides.get('page'), 'markdown_cache', None) for _, overrides, _ in chunk)
+        if cache is not None
+    }.values())
+    minify_caches = [_worker_minify_cache] if _worker_minify_cache is not None else []
+    markdown_before, minify_before = _cache_counts(markdown_caches), _cache_counts(minify_caches)
+
+    results = []
+    for template_name, overrides, output_path in chunk:
+        with rendering_once(overrides.get('page')):
+            html = _worker_env.render_layered(template_name, overrides, _worker_context)
+        if _worker_minify_cache is not None:
+            html = minify_html(html, _worker_minify_cache)
+        results.append((output_path, html))
+
+    markdown_after, minify_after = _cache_counts(markdown_caches), _cache_counts(minify_caches)
+    return (
+        results,
+        (markdown_after[0] - markdown_before[0], markdown_after[1] - markdown_before[1]),
+        (minify_after[0] - minify_before[0], minify_after[1] - minify_before[1])
+    )
+
+def render_templates(env, context, render_jobs, jobs=1, minify_cache=None, markdown_cache=None):
+    """
+    Render (template name, context overrides, output path) jobs.
+
+    Yields (output path, html) in job order, as the jobs come in: `render_jobs`
+    can be a generator, and a job is only taken once the pipeline has room
+    for it, so neither the jobs nor their HTML pile up in memory. Templates
+    read the overrides layered over the shared context (see
+    SiteEnvironment.render_layered), which is never copied per page, and a
+    page's body is rendered at most once per output. With
+    several jobs, the context is sent once to each worker and jobs travel in
+    chunks of RENDER_CHUNK_SIZE, with at most RENDER_WINDOW chunks in flight
+    per worker. With a `minify_cache`, the HTML is minified (in the workers,
+    through the shared cache). The cache hits/misses of the workers are
+    added to `minify_cache` and `markdown_cache`.
+    """
+    render_jobs = iter(render_jobs)
+    head = list(islice(render_jobs, 2))
+    render_jobs = chain(head, render_jobs)
+
+    if jobs <= 1 or len(head) <= 1:
+        for template_name, overrides, output_path in render_jobs:
+            with profiler.step("template", output_path), rendering_once(overrides.get('page')):
+                html = env.render_layered(template_name, overrides, context)
+            if minify_cache is not None:
+                with profiler.step("minify", output_path):
+                    html = minify_html(html, minify_cache)
+            yield output_path, html
+        return
+
+    chunks = iter(lambda: list(islice(render_jobs, RENDER_CHUNK_SIZE)), [])
+    with ProcessPoolExecutor(jobs, initializer=_init_render_worker, initargs=(context, minify_cache)) as pool:
+        def chunk_results(future):
+            results, markdown_stats, minify_stats = future.result()
+            if markdown_cache is not None:
+                markdown_cache.merge_stats(*markdown_stats)
+            if minify_cache is not None:
+                minify_cache.merge_stats(*minify_stats)
+            return results
+
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_render_chunk, chunk))
+            if len(pending) >= jobs * RENDER_WINDOW:
+                yield from chunk_results(pending.popleft())
+        while pending:
+            yield from chunk_results(pending.popleft())
+
+def load_sync_state():
+    """Load the state recorded by the previous sync (if any)"""
+    try:
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if state.get('version') != SYNC_STATE_VERSION:
+        return None
+    return state
+
+def save_sync_state(state):
+    """Persist the sync state for the next build"""
+    ensure_dir(CACHE_DIR)
+    tmp_path = SYNC_STATE_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, sort_keys=True)
+    os.replace(tmp_path, SYNC_STATE_FILE)
+
+def file_signature(path):
+    """Return the (mtime, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def note_unchanged(md_file, signature, previous, post_dir, vault_index=None):
+    """Check whether a synced note, its assets and its output are still up to date"""
+    if previous is None or not (post_dir / "index.md").exists():
+        return False
+
+    # Any attachment that changed or disappeared forces the note to be re-processed
+    for asset_path, asset_signature in previous['assets'].items():
+        if file_signature(asset_path) != asset_signature:
+            return False
+
+    # So does an embed that did not resolve last time and now does (the attachment was added since)
+    for asset_name in previous['unresolved']:
+        if find_file_in_vault(asset_name, md_file, vault_index):
+            return False
+
+    if previous['signature'] == signature:
+        return True
+
+    # Touched but identical content (e.g. a save without edits)
+    return previous['hash'] == hash_file(md_file)
+
 def sync_content(config):
-    """Sync external content to local content structure if external paths are specified"""
+    """
+    Sync external content to local content structure if external paths are specified.
+
+    The sync is incremental: a state file records every note's mtime, size and
+    hash together with the attachments it pulled in and the embeds that did
+    not resolve, so only added, changed or deleted notes (or notes whose
+    missing attachments appeared) are processed and stale post directories
+    are removed.
+    Returns the post directories that were added, changed or deleted (None
+    when no sync is configured).
+    """
     sync_config = config.get("sync", {})
     external_sync_path = sync_config.get("path")
 
@@ -200,18 +598,40 @@ def sync_content(config):
     source_type = sync_config.get("type", "markdown")
 
     print(f"Syncing content from: {external_path} (type: {source_type})")
+    start_time = time.perf_counter()
 
-    # Clean existing blog content directory
     blog_content_dir = Path(CONTENT_DIR) / "blog"
-    if blog_content_dir.exists():
-        shutil.rmtree(blog_content_dir)
+
+    # Start from scratch when there is no usable state for this source
+    state = load_sync_state()
+    if state is None or state.get('source') != str(external_path) or state.get('type') != source_type:
+        if blog_content_dir.exists():
+            shutil.rmtree(blog_content_dir)
+        state = {'notes': {}}
     ensure_dir(blog_content_dir)
 
     # Create _index.md file for the blog section
-    create_blog_index(blog_content_dir)
+    if not (blog_content_dir / "_index.md").exists():
+        create_blog_index(blog_content_dir)
+
+    # Index the vault once so embeds resolve with lookups instead of vault-wide globs
+    vault_index = None
+    vault_root = find_vault_root(external_path) if source_type == "obsidian" else None
+    if vault_root:
+        vault_index = VaultIndex.load(vault_root, VAULT_INDEX_FILE)
+        vault_index.refresh()
+        vault_index.save(VAULT_INDEX_FILE)
+        print(f"  Vault index: {vault_index.file_count()} files in {len(vault_index.directories)} "
+              f"directories ({vault_index.rescanned} re-listed)")
+
+    previous_notes = state['notes']
+    notes = {}
+    counts = {'added': 0, 'changed': 0, 'deleted': 0, 'unchanged': 0}
+    timings = {change: 0.0 for change in counts}
+    post_dirs = {'added': [], 'changed': [], 'deleted': []}
 
     # Process all markdown files in external blog directory
-    for md_file in external_path.glob("**/*.md"):
+    for md_file in sorted(external_path.glob("**/*.md")):
         # Skip files in .obsidian directory and other hidden folders
         if any(part.startswith('.') for part in md_file.parts):
             continue
@@ -220,9 +640,22 @@ def sync_content(config):
         if md_file.stem.startswith('_'):
             continue
 
+        note_start = time.perf_counter()
+        note_key = str(md_file.relative_to(external_path))
+        previous = previous_notes.get(note_key)
+        signature = file_signature(md_file)
+
         # Generate slug for directory name
         post_slug = slugify(md_file.stem)
         post_dir = blog_content_dir / post_slug
+
+        if note_unchanged(md_file, signature, previous, post_dir, vault_index):
+            notes[note_key] = {**previous, 'signature': signature}
+            counts['unchanged'] += 1
+            timings['unchanged'] += time.perf_counter() - note_start
+            continue
+
+        change = 'added' if previous is None else 'changed'
         ensure_dir(post_dir)
 
         # Read and process markdown content
@@ -230,115 +663,471 @@ def sync_content(config):
             content = f.read()
 
         # Find and copy assets, update content references
-        content, assets_copied = process_assets(content, md_file, post_dir, source_type)
+        content, assets, unresolved = process_assets(content, md_file, post_dir, source_type, vault_index)
 
         # Write the processed markdown as index.md
         with open(post_dir / "index.md", 'w', encoding='utf-8') as f:
             f.write(content)
 
-        print(f"  ✓ Synced: {md_file.name} -> {post_slug}/ ({assets_copied} assets)")
+        # Assets already present with the same content were kept, drop the ones no longer referenced
+        referenced = {asset_filename for _, asset_filename in assets}
+        assets_dir = post_dir / "assets"
+        if assets_dir.exists():
+            for asset_file in assets_dir.iterdir():
+                if asset_file.name not in referenced:
+                    asset_file.unlink()
+
+        notes[note_key] = {
+            'signature': signature,
+            'hash': hash_file(md_file),
+            'slug': post_slug,
+            'assets': {str(source): file_signature(source) for source, _ in assets},
+            'unresolved': sorted(set(unresolved))
+        }
 
-    print("Content sync completed.")
+        counts[change] += 1
+        timings[change] += time.perf_counter() - note_start
+        post_dirs[change].append(post_dir)
+        print(f"  ✓ Synced ({change}): {md_file.name} -> {post_slug}/ ({len(referenced)} assets)")
 
-def build_site():
-    """Build the entire site"""
+    # Remove post directories whose note disappeared
+    live_slugs = {note['slug'] for note in notes.values()}
+    for note_key, previous in previous_notes.items():
+        if note_key in notes:
+            continue
+
+        note_start = time.perf_counter()
+        if previous['slug'] not in live_slugs:
+            post_dir = blog_content_dir / previous['slug']
+            if post_dir.exists():
+                shutil.rmtree(post_dir)
+            post_dirs['deleted'].append(post_dir)
+        counts['deleted'] += 1
+        timings['deleted'] += time.perf_counter() - note_start
+        print(f"  ✗ Removed: {note_key} -> {previous['slug']}/")
+
+    save_sync_state({
+        'version': SYNC_STATE_VERSION,
+        'source': str(external_path),
+        'type': source_type,
+        'notes': notes
+    })
+
+    summary = ", ".join(f"{counts[change]} {change} ({timings[change]:.3f}s)" for change in counts)
+    print(f"Content sync completed in {time.perf_counter() - start_time:.3f}s: {summary}")
+
+    return post_dirs
+
+def build_site(incremental=False, jobs=1, link_mode="copy", optimize=True, dump_context=False, compress=False,
+               minify=False, fingerprint=False, env=None, staged=True):
+    """
+    Build the entire site.
+
+    With `incremental`, the previous output is kept and only files whose inputs
+    changed since the last build (according to the manifest) are rewritten.
+    With `jobs` > 1, markdown and template rendering run on a process pool.
+    `link_mode` selects how static and content assets are placed in the output
+    (copy, hardlink or reflink). With `optimize`, raster content images get
+    responsive WebP variants. With `dump_context`, the whole template context
+    is also written to data.json. With `compress`, text outputs get .gz (and
+    .br when brotli is installed) variants. With `minify`, rendered HTML and
+    static stylesheets are minified. With `fingerprint`, assets get
+    content-hashed copies that pages and templates (through the `asset`
+    filter) link to. An `env` from a previous build (see serve.py) is reused,
+    so only templates that changed since are compiled again.
+
+    With `staged`, the site is built in a staging directory (seeded with
+    hardlinks of the previous output for incremental builds) that replaces
+    public/ in one atomic swap once complete, so public/ is never empty or
+    half-built. Files whose bytes did not change keep their previous mtime.
+    Without it, public/ is updated in place (used by the development server,
+    which keeps writing to the same output paths after the build).
+    """
     # Load configuration
     config = load_config(CONFIG_FILE)
 
     # Sync external content first (only if configured)
-    sync_content(config)
+    with profiler.phase("sync"):
+        sync_content(config)
 
-    # Setup Jinja environment
-    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
+    # Setup Jinja environment (templates come from memory or the bytecode cache when unchanged)
+    with profiler.phase("templates"):
+        env = env or create_environment()
+        templates_summary = env.precompile()
 
-    # Add custom filters
-    env.filters['slugify'] = slugify
+    output_dir = STAGING_DIR if staged else PUBLIC_DIR
+    manifest = BuildManifest(MANIFEST_FILE, env, output_dir, reuse=incremental)
 
-    # Clean public directory
-    if os.path.exists(PUBLIC_DIR):
-        shutil.rmtree(PUBLIC_DIR)
-    ensure_dir(PUBLIC_DIR)
+    # Start from a clean output directory (incremental builds reuse the previous output)
+    with profiler.phase("clean"):
+        if staged and os.path.exists(STAGING_DIR):
+            shutil.rmtree(STAGING_DIR)  # left over by an interrupted build
+        elif not staged and not incremental and os.path.exists(PUBLIC_DIR):
+            shutil.rmtree(PUBLIC_DIR)
 
-    # Copy static files
-    copy_static_files()
+        if staged and incremental and os.path.exists(PUBLIC_DIR):
+            clone_tree(PUBLIC_DIR, STAGING_DIR)
+        ensure_dir(output_dir)
 
-    # Copy asset files from content
-    copy_content_assets()
+    # Minified HTML and CSS are cached by content hash
+    minify_cache = DiskCache(MINIFY_CACHE_DIR, MINIFY_CACHE_SIZE) if minify else None
 
-    # Process content
-    content = process_content()
+    # Copy static files
+    with profiler.phase("static assets"):
+        static_assets = copy_static_files(link_mode, minify_cache, output_dir)
+        for asset_path in static_assets:
+            manifest.record(asset_path)
 
-    # Add current year for copyright
-    config["current_year"] = datetime.now().year
+    # Copy asset files from content
+    with profiler.phase("content assets"):
+        content_assets = copy_content_assets(link_mode, output_dir)
+        for asset_path in content_assets:
+            manifest.record(asset_path)
+
+    # Convert content images to WebP variants (cached by source hash)
+    image_variants = {}
+    if optimize:
+        with profiler.phase("images"):
+            image_cache = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_SIZE)
+            image_variants = optimize_images(content_assets, image_cache, jobs)
+            image_cache.prune()
+            for variants in image_variants.values():
+                for variant_path, _ in variants:
+                    manifest.record(variant_path)
+
+    # Content-hashed twins of the assets, for immutable caching
+    static_fingerprints = {}
+    fingerprints = {}
+    if fingerprint:
+        with profiler.phase("fingerprint"):
+            static_fingerprints = fingerprint_assets(static_assets)
+            fingerprints = {**static_fingerprints, **fingerprint_assets(content_assets)}
+            for variants in image_variants.values():
+                fingerprints.update(fingerprint_assets(variant_path for variant_path, _ in variants))
+
+            for fingerprinted in fingerprints.values():
+                manifest.record(fingerprinted)
+            manifest.record(write_asset_manifest(asset_urls(fingerprints, output_dir), output_dir))
+
+    # Load page metadata (bodies are rendered from the markdown cache when a template or index reads them)
+    with profiler.phase("content"):
+        markdown_cache = DiskCache(MARKDOWN_CACHE_DIR, MARKDOWN_CACHE_SIZE)
+        content = process_content(markdown_cache, jobs, output_dir)
+
+        # Serve optimized images through <picture>/srcset, from their fingerprinted URLs
+        for page in content['pages']:
+            apply_image_variants(page, image_variants, output_dir)
+            apply_fingerprints(page, fingerprints, output_dir)
+
+        # Rendered bodies depend on the assets they reference as well as on the source (see `content_digest`)
+        page_assets = {}
+        if image_variants or fingerprints:
+            page_assets = page_asset_inputs(
+                content['pages'], image_variants, fingerprints, static_fingerprints, output_dir
+            )
+
+    # Term vectors of the posts, cached by content digest
+    term_cache = DiskCache(TERM_CACHE_DIR, TERM_CACHE_SIZE)
+
+    # Post index and per-post content shards (a shard's body is only rendered when its inputs changed).
+    # Term vectors (search index and related posts) are cached from the same rendering of each body.
+    with profiler.phase("index"):
+        index_path = Path(output_dir) / INDEX_FILE
+        index_text = render_index(content['posts'])
+        index_entry = {'inputs': {'text': hash_data(index_text)}, 'source': None, 'templates': []}
+        manifest.record(index_path, index_entry)
+        if not manifest.is_fresh(index_path, index_entry):
+            write_file(index_path, index_text)
+
+        for post in content['posts']:
+            entry = {
+                'inputs': {'post': hash_data(post_entry(post)), 'content': post['content_digest']},
+                'source': None,
+                'templates': []
+            }
+            if page_assets:
+                entry['inputs']['page_assets'] = manifest.hash_value(page_assets[post['output_path'].parent])
+            manifest.record(shard_path(post), entry)
+            with rendering_once(post):
+                term_vector(post, term_cache)
+                if not manifest.is_fresh(shard_path(post), entry):
+                    write_file(shard_path(post), render_shard(post))
+
+    # Related posts from shared tags and text similarity
+    related_posts = None
+    if related_posts_count(config):
+        with profiler.phase("related"):
+            related_posts = RelatedPosts.from_posts(content['posts'], term_cache)
+            apply_related_posts(content, related_posts, related_posts_count(config))
+
+    # Templates reach static files through the `asset` filter
+    context = build_context(config, content, asset_urls(static_fingerprints, output_dir))
+
+    skipped = 0
+
+    def stale_outputs():
+        """Record every output in the manifest, yielding the render jobs of those whose inputs changed"""
+        nonlocal skipped
+        for template_name, overrides, output_path, source in site_outputs(env, config, content, output_dir):
+            with profiler.step("plan", output_path):
+                entry = manifest.inputs_for(template_name, context, source, overrides)
+                if minify:
+                    entry['inputs']['minify'] = MINIFY_VERSION
+                if static_fingerprints:
+                    # The asset filter reads asset_urls without templates naming it
+                    entry['inputs']['asset_urls'] = manifest.hash_value(context['asset_urls'])
+                page = overrides.get('page')
+                if page_assets and isinstance(page, Page):
+                    entry['inputs']['page_assets'] = manifest.hash_value(page_assets[page['output_path'].parent])
+                manifest.record(output_path, entry)
+                fresh = manifest.is_fresh(output_path, entry)
+
+            # Skip outputs whose inputs are unchanged
+            if fresh:
+                skipped += 1
+                continue
+
+            yield template_name, overrides, output_path
+
+    # Outputs stream through plan -> render -> write, so only the jobs in flight are held at once
+    rendered = 0
+    with profiler.phase("render"):
+        for output_path, html in render_templates(env, context, stale_outputs(), jobs, minify_cache, markdown_cache):
+            with profiler.step("write", output_path):
+                write_file(output_path, html)
+            rendered += 1
+
+    # The sitemap only depends on page URLs, dates and the base URL
+    with profiler.phase("sitemap"):
+        sitemap_path = Path(output_dir) / "sitemap.xml"
+        sitemap_entry = {
+            'inputs': {
+                'pages': hash_data([(page['url'], page['date']) for page in content['pages']]),
+                'base_url': hash_data(config.get("base_url", ""))
+            },
+            'source': None,
+            'templates': []
+        }
+        manifest.record(sitemap_path, sitemap_entry)
+        sitemap_changed = not manifest.is_fresh(sitemap_path, sitemap_entry)
+        if sitemap_changed:
+            generate_sitemap(content['pages'], config, output_dir)
+
+    # Inverted full-text index, sharded by term prefix
+    with profiler.phase("search"):
+        search_index = SearchIndex.from_posts(content['posts'], term_cache)
+        search_outputs, _ = search_index.changed_outputs(output_dir)
+        for output_path, text in search_outputs:
+            entry = {'inputs': {'text': hash_data(text)}, 'source': None, 'templates': []}
+            manifest.record(output_path, entry)
+            if not manifest.is_fresh(output_path, entry):
+                write_file(output_path, text)
+
+    # Full template context, for debugging templates only
+    if dump_context:
+        with profiler.phase("data.json"):
+            data_path = Path(output_dir) / 'data.json'
+            manifest.record(data_path)
+            with open(data_path, 'w') as f:
+                json.dump(context, f, sort_keys=True, indent=4, default=to_json)
+
+    # Precompressed .gz/.br variants of text outputs (cached by content hash)
+    compressed = []
+    if compress:
+        with profiler.phase("compress"):
+            compress_cache = DiskCache(COMPRESS_CACHE_DIR, COMPRESS_CACHE_SIZE)
+            compressed = compress_outputs(manifest.outputs(), compress_cache, jobs)
+            compress_cache.prune()
+            for _, _, variants, _ in compressed:
+                for variant_path in variants:
+                    manifest.record(variant_path)
+
+    with profiler.phase("cleanup"):
+        removed = manifest.remove_stale()
+        markdown_cache.prune()
+        term_cache.prune()
+
+    # Swap the finished site in (unchanged files keep their previous version and mtime)
+    changes = None
+    if staged:
+        with profiler.phase("publish"):
+            changes = restore_unchanged(PUBLIC_DIR, STAGING_DIR)
+            publish(STAGING_DIR, PUBLIC_DIR)
+
+    manifest.save()
 
-    context = {
-        "site": config,
-        "pages": content['pages'],
-        "posts": content['posts'],
-        "sections": content['sections'],
-        "nav": content['nav'],
-        "tags": content['tags']
+    print(f"Site built successfully! {len(content['pages'])} pages processed.")
+    if sitemap_changed:
+        # Reported once published (a staged build writes it to the staging directory)
+        print(f"Sitemap generated at {Path(PUBLIC_DIR) / 'sitemap.xml'}")
+    print(f"Templates: {templates_summary}")
+    print(f"Markdown cache: {markdown_cache.summary()}")
+    if minify:
+        minify_cache.prune()
+        print(f"Minify cache: {minify_cache.summary()}")
+    if compress:
+        print(f"Compression: {compression_summary(compressed)}")
+    if incremental:
+        print(f"Incremental build: {rendered} rendered, {skipped} unchanged, {removed} removed.")
+    if changes is not None:
+        print(f"Output: {changes['new']} new, {changes['changed']} changed, {changes['removed']} removed, "
+              f"{changes['unchanged']} unchanged files.")
+
+    # Keep the build state around for targeted rebuilds (see serve.py, which builds unstaged)
+    return {
+        'config': config,
+        'env': env,
+        'content': content,
+        'context': context,
+        'image_variants': image_variants,
+        'markdown_cache': markdown_cache,
+        'search_index': search_index,
+        'related_posts': related_posts
     }
 
-    # Render all pages
-    for page in content['pages']:
-        template = env.get_template(page['layout'])
-        page_context = context.copy()
-        page_context["page"] = page
+def build_in_memory(store, jobs=1, env=None):
+    """
+    Render the site into `store` (see memory.py) instead of public/.
 
-        # For section pages, add section-specific posts
-        if page['is_index'] and page['section']:
-            section_posts = content['sections'].get(page['section'], [])
-            page_context["section_posts"] = section_posts
+    Used by the development server: pages, the sitemap and the post index are kept
+    in memory while static and content assets are served from their source
+    location, so nothing is copied or written to disk. Images are served as-is
+    (no WebP variants). An `env` from a previous build is reused.
+    """
+    config = load_config(CONFIG_FILE)
+    sync_content(config)
+    env = env or create_environment()
+    templates_summary = env.precompile()
 
-        html = template.render(**page_context)
+    markdown_cache = DiskCache(MARKDOWN_CACHE_DIR, MARKDOWN_CACHE_SIZE)
+    content = process_content(markdown_cache, jobs)
+    term_cache = DiskCache(TERM_CACHE_DIR, TERM_CACHE_SIZE)
 
-        # Write output file
-        ensure_dir(page['output_path'].parent)
-        with open(page['output_path'], 'w') as f:
-            f.write(html)
+    related_posts = None
+    if related_posts_count(config):
+        related_posts = RelatedPosts.from_posts(content['posts'], term_cache)
+        apply_related_posts(content, related_posts, related_posts_count(config))
 
-    # Generate tag pages for the blog
-    if "blog" in content['sections'] and content['tags']:
-        # Get the blog template
-        tag_template = env.get_template(LIST_LAYOUT)
+    context = build_context(config, content)
 
-        # Create a tag page for each tag
-        for tag_slug, tag_data in content['tags'].items():
-            tag_dir = Path(PUBLIC_DIR) / "blog" / tag_slug
-            ensure_dir(tag_dir)
-
-            # Create page context
-            tag_context = context.copy()
-            tag_context["page"] = {
-                'is_index': True,
-                'section': 'blog',
-                'is_tag_page': True,
-                'tag': tag_data['name'],
-                'tag_slug': tag_slug
-            }
-            tag_context["section_posts"] = tag_data['posts']
-            tag_context["is_filtered"] = True
-            tag_context["current_tag"] = tag_data['name']
+    render_jobs = (
+        (template_name, overrides, output_path)
+        for template_name, overrides, output_path, _ in site_outputs(env, config, content)
+    )
 
-            # Render and write tag page
-            html = tag_template.render(**tag_context)
-            with open(tag_dir / "index.html", 'w') as f:
-                f.write(html)
+    store.clear()
+    for output_path, html in render_templates(env, context, render_jobs, jobs, markdown_cache=markdown_cache):
+        store.write(output_path, html)
 
-    # Create 404 page
-    if env.list_templates() and "404.html" in env.list_templates():
-        template = env.get_template("404.html")
-        html = template.render(**context)
-        with open(f"{PUBLIC_DIR}/404.html", 'w') as f:
-            f.write(html)
+    store.write(Path(PUBLIC_DIR) / "sitemap.xml", render_sitemap(content['pages'], config))
+    for output_path, text in index_outputs(content, PUBLIC_DIR):
+        store.write(output_path, text)
 
-    generate_sitemap(content['pages'], config, PUBLIC_DIR)
+    search_index = SearchIndex.from_posts(content['posts'], term_cache)
+    for output_path, text in search_index.changed_outputs(PUBLIC_DIR)[0]:
+        store.write(output_path, text)
+    markdown_cache.prune()
+    term_cache.prune()
 
-    print(f"Site built successfully! {len(content['pages'])} pages processed.")
+    print(f"Site rendered in memory! {len(content['pages'])} pages processed.")
+    print(f"Templates: {templates_summary}")
+    print(f"Markdown cache: {markdown_cache.summary()}")
 
-    with open(Path(PUBLIC_DIR) / 'data.json', 'w') as f:
-        json.dump(context, f, sort_keys=True, indent=4, default=str)
+    return {
+        'config': config,
+        'env': env,
+        'content': content,
+        'context': context,
+        'image_variants': {},
+        'markdown_cache': markdown_cache,
+        'search_index': search_index,
+        'related_posts': related_posts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the static site")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="only rebuild outputs whose inputs changed since the last build"
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=os.cpu_count() or 1,
+        help="number of worker processes for rendering (default: number of CPU cores)"
+    )
+    parser.add_argument(
+        "--link", choices=LINK_MODES, default="copy",
+        help="how to place static and content assets in the output (default: copy)"
+    )
+    parser.add_argument(
+        "--no-images", action="store_true",
+        help="skip generating responsive WebP variants of content images"
+    )
+    parser.add_argument(
+        "--fingerprint", action="store_true",
+        help="give assets content-hashed filenames (see asset-manifest.json) so they can be cached forever"
+    )
+    parser.add_argument(
+        "--minify", action="store_true",
+        help="minify rendered HTML and static stylesheets (<pre>, code and LaTeX are left untouched)"
+    )
+    parser.add_argument(
+        "--compress", action="store_true",
+        help="write precompressed .gz (and .br, when brotli is installed) variants of text outputs"
+    )
+    parser.add_argument(
+        "--debug-context", action="store_true",
+        help="also dump the full template context to public/data.json"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"time every build phase and page step, print the slowest ones and write a JSON trace to {PROFILE_FILE}"
+    )
+    parser.add_argument(
+        "--profile-top", type=int, default=15, metavar="N",
+        help="number of page steps listed in the profile summary (default: 15)"
+    )
+    parser.add_argument(
+        "--cprofile", metavar="FILE",
+        help="also run the build under cProfile and save the stats to FILE (inspect with pstats or snakeviz)"
+    )
+    args = parser.parse_args()
+
+    jobs = args.jobs
+    if (args.profile or args.cprofile) and jobs > 1:
+        # Worker processes would escape both profilers
+        jobs = 1
+        print("Profiling: building on a single process")
+
+    build_profiler = None
+    if args.profile:
+        build_profiler = profiler.BuildProfiler()
+        profiler.activate(build_profiler)
+        build_profiler.start()
+
+    code_profiler = None
+    if args.cprofile:
+        import cProfile
+        code_profiler = cProfile.Profile()
+        code_profiler.enable()
+
+    try:
+        build_site(
+            incremental=args.incremental, jobs=jobs, link_mode=args.link, optimize=not args.no_images,
+            dump_context=args.debug_context, compress=args.compress, minify=args.minify,
+            fingerprint=args.fingerprint
+        )
+    finally:
+        if code_profiler is not None:
+            code_profiler.disable()
+            code_profiler.dump_stats(args.cprofile)
+            print(f"cProfile stats saved to {args.cprofile}")
+
+        if build_profiler is not None:
+            build_profiler.stop()
+            profiler.activate(None)
+            build_profiler.report(args.profile_top)
+            build_profiler.save(PROFILE_FILE)
+            print(f"\nProfile trace saved to {PROFILE_FILE}")
 
 if __name__ == "__main__":
-    build_site()
\ No newline at end of file
+    main()
@@ -0,0 +1,105 @@
+"""
+cache.py - Persistent content-addressed cache with a size cap and LRU eviction
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from src.utils import ensure_dir
+
+
+class DiskCache:
+    """
+    Store build artifacts on disk under the hash of everything that produced them.
+
+    Entries are plain files sharded by the first two characters of their key.
+    Reads refresh the entry's mtime, so pruning the oldest mtimes first gives
+    least-recently-used eviction once the cache grows past `max_bytes`.
+    Writes are atomic, which makes the cache safe to share between processes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _path(self, key):
+        return self.directory / key[:2] / key
+
+    def get(self, key):
+        """Return the cached bytes for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store bytes under a key"""
+        path = self._path(key)
+        ensure_dir(path.parent)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits in max_bytes"""
+        if not self.directory.exists():
+            return 0
+
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*"):
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evicted += 1
+
+        return self.evicted
+
+    def merge_stats(self, hits, misses):
+        """Add hit/miss counts gathered in worker processes"""
+        self.hits += hits
+        self.misses += misses
+
+    def summary(self):
+        """Return a human-readable hit/miss summary"""
+        lookups = self.hits + self.misses
+        ratio = (self.hits / lookups * 100) if lookups else 0
+        return f"{self.hits} hits, {self.misses} misses ({ratio:.0f}% hit rate), {self.evicted} evicted"
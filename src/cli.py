@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+cli.py - Single entry point for the build, serve, new and bench commands
+"""
+
+import sys
+import importlib
+
+PROGRAM = "microblog"
+
+# command -> (module, function, description); modules are only imported when their command runs
+COMMANDS = {
+    "build": ("src.build", "main", "Build the static site into public/"),
+    "serve": ("src.serve", "main", "Serve the site with live reload"),
+    "new": ("src.utils", "create_new_post", "Create a new blog post"),
+    "bench": ("src.benchmark", "main", "Benchmark the site generator on a synthetic corpus")
+}
+
+
+def load_command(name):
+    """Import the module of a command and return its entry point"""
+    module_name, function_name, _ = COMMANDS[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+def usage():
+    lines = [f"usage: {PROGRAM} <command> [options]", "", "commands:"]
+    lines.extend(f"  {name:<8} {description}" for name, (_, _, description) in COMMANDS.items())
+    lines.append(f"\nRun '{PROGRAM} <command> --help' for the options of a command.")
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+
+    name, *options = argv
+    if name not in COMMANDS:
+        print(f"{PROGRAM}: unknown command '{name}'\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    # The commands parse sys.argv themselves
+    sys.argv = [f"{PROGRAM} {name}", *options]
+    return load_command(name)()
+
+if __name__ == "__main__":
+    sys.exit(main())
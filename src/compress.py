@@ -0,0 +1,111 @@
+"""
+compress.py - Precompressed .gz and .br variants of text outputs
+"""
+
+import gzip
+import zlib
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils import hash_data, write_file
+
+COMPRESSIBLE_SUFFIXES = {'.html', '.css', '.js', '.json', '.xml', '.svg', '.txt'}
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def brotli_available():
+    """Check whether the brotli module (the optional compression dependency) is installed"""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def compressors():
+    """Return {suffix: (library version, compress function)} for the available formats"""
+    formats = {
+        '.gz': (zlib.ZLIB_VERSION, lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    }
+    if brotli_available():
+        import brotli
+        formats['.br'] = (brotli.__version__, lambda data: brotli.compress(data, quality=BROTLI_QUALITY))
+    return formats
+
+def compress_file(path, cache):
+    """
+    Write the compressed variants of a file next to it (path.gz, path.br).
+
+    Compressed bytes are cached under the hash of the content, format and
+    settings, so an unchanged file is never recompressed. Variants that would
+    not be smaller than the file itself are not written. Returns
+    (path, original size, {variant path: size}, number of cache misses).
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    variants = {}
+    misses = 0
+    for suffix, (version, compress) in compressors().items():
+        key = hash_data({'content': content_hash, 'format': suffix, 'version': version,
+                         'level': GZIP_LEVEL if suffix == '.gz' else BROTLI_QUALITY})
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(data)
+            cache.set(key, compressed)
+            misses += 1
+
+        variant_path = path.with_name(path.name + suffix)
+        if len(compressed) >= len(data):
+            continue
+
+        # Leave identical variants from a previous build untouched
+        if not (variant_path.exists() and variant_path.read_bytes() == compressed):
+            write_file(variant_path, compressed)
+        variants[variant_path] = len(compressed)
+
+    return path, len(data), variants, misses
+
+def _compress_job(job):
+    path, cache = job
+    return compress_file(path, cache)
+
+def compress_outputs(paths, cache, jobs=1):
+    """
+    Precompress every compressible file in `paths`, on a process pool when `jobs` > 1.
+
+    Returns a list of (path, original size, {variant path: size}, cache misses).
+    """
+    files = sorted(Path(path) for path in paths if Path(path).suffix.lower() in COMPRESSIBLE_SUFFIXES)
+    if not files:
+        return []
+
+    job_args = [(path, cache) for path in files]
+    if jobs <= 1 or len(files) <= 1:
+        return list(map(_compress_job, job_args))
+
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(_compress_job, job_args, chunksize=max(1, len(files) // (jobs * 4))))
+
+def compression_summary(results):
+    """Human-readable totals: sizes per format, ratio and bytes saved"""
+    original = sum(size for _, size, _, _ in results)
+    misses = sum(result[3] for result in results)
+
+    totals = {}
+    for _, size, variants, _ in results:
+        for variant_path, compressed_size in variants.items():
+            total = totals.setdefault(variant_path.suffix, [0, 0])
+            total[0] += size
+            total[1] += compressed_size
+
+    formats = ", ".join(
+        f"{suffix[1:]} {compressed / 1024:.1f} KB ({compressed / size * 100:.0f}% of original, "
+        f"{(size - compressed) / 1024:.1f} KB saved)"
+        for suffix, (size, compressed) in sorted(totals.items())
+    )
+    return f"{len(results)} files, {original / 1024:.1f} KB -> {formats or 'nothing worth compressing'} ({misses} newly compressed, the rest from cache)"
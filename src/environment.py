@@ -0,0 +1,106 @@
+"""
+environment.py - Long-lived Jinja environment with an on-disk bytecode cache
+"""
+
+import time
+from collections import ChainMap
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, TemplateNotFound
+
+from src.utils import ensure_dir
+
+
+class CountingBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that counts how many templates it could provide"""
+
+    def __init__(self, directory):
+        ensure_dir(directory)
+        super().__init__(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+class SiteEnvironment(Environment):
+    """
+    Jinja environment meant to outlive a single build.
+
+    Compiled templates stay in memory and are reloaded when their file changes
+    (auto_reload compares mtimes on every lookup), so the dev server reuses one
+    environment across rebuilds. With a `bytecode_dir`, compiled templates are
+    also stored on disk (keyed by a checksum of their source), so a fresh process
+    (a one-shot CLI build or a render worker) skips lexing and compiling templates
+    that did not change. Parsed ASTs for dependency tracking are reused the same
+    way, for as long as the template source is unchanged.
+    """
+
+    def __init__(self, templates_dir, bytecode_dir=None):
+        super().__init__(
+            loader=FileSystemLoader(templates_dir),
+            bytecode_cache=CountingBytecodeCache(bytecode_dir) if bytecode_dir else None,
+            auto_reload=True
+        )
+        self.compiled = 0
+        self._parsed = {}
+
+    def compile(self, source, name=None, filename=None, raw=False, defer_init=False):
+        if not raw:
+            self.compiled += 1
+        return super().compile(source, name, filename, raw, defer_init)
+
+    def parse_template(self, name):
+        """Return the AST of a template, parsing it again only when its source changed"""
+        source = self.loader.get_source(self, name)[0]
+        parsed = self._parsed.get(name)
+        if parsed is None or parsed[0] != source:
+            parsed = self._parsed[name] = (source, self.parse(source))
+        return parsed[1]
+
+    def render_layered(self, name, *layers):
+        """
+        Render a template against layered variables (e.g. page overrides, then the shared context).
+
+        Template.render() merges its variables and the globals into a new dict
+        for every call; here the template reads through the layers instead, so
+        the shared context is never copied.
+        """
+        template = self.get_template(name)
+        context = template.new_context(ChainMap(*layers, template.globals), shared=True)
+        try:
+            return self.concat(template.root_render_func(context))
+        except Exception:
+            self.handle_exception()
+
+    def has_template(self, name):
+        """Check whether a template exists (through the template cache, without listing the directory)"""
+        try:
+            self.get_template(name)
+        except TemplateNotFound:
+            return False
+        return True
+
+    def precompile(self):
+        """
+        Load every template up front and report how long it took.
+
+        Templates already in memory and unchanged cost an mtime check, the rest
+        come from the bytecode cache or get compiled. Returns a summary string.
+        """
+        compiled = self.compiled
+        bytecode_hits = self.bytecode_cache.hits if self.bytecode_cache else 0
+
+        start_time = time.perf_counter()
+        names = self.list_templates()
+        for name in names:
+            self.get_template(name)
+        elapsed = time.perf_counter() - start_time
+
+        compiled = self.compiled - compiled
+        loaded = (self.bytecode_cache.hits if self.bytecode_cache else 0) - bytecode_hits
+        cached = len(names) - compiled - loaded
+        return (f"{len(names)} ready in {elapsed * 1000:.1f} ms "
+                f"({compiled} compiled, {loaded} from bytecode cache, {cached} already in memory)")
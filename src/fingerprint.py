@@ -0,0 +1,109 @@
+"""
+fingerprint.py - Content-hashed asset filenames for immutable caching
+"""
+
+import os
+import re
+import json
+import posixpath
+from pathlib import Path
+from jinja2 import pass_context
+
+from src.utils import hash_file, transfer_file, write_file
+
+FINGERPRINT_LENGTH = 10  # hex characters of the content hash kept in the filename
+FINGERPRINT_SUFFIXES = {
+    '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg', '.ico',
+    '.woff', '.woff2', '.ttf', '.otf', '.mp4', '.webm', '.pdf'
+}
+ASSET_MANIFEST_FILE = "asset-manifest.json"
+
+URL_ATTR_PATTERN = re.compile(r'\b(src|href|srcset)="([^"]+)"')
+
+
+def fingerprinted_path(path, digest):
+    """styles.css -> styles.<hash>.css"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{digest[:FINGERPRINT_LENGTH]}{path.suffix}")
+
+def fingerprint_assets(paths):
+    """
+    Give every fingerprintable output a content-hashed twin.
+
+    The hashed file is a hardlink of the output (a copy where hardlinks are
+    not supported); the original stays in place for links from outside the
+    site. An unchanged asset gets the same name on every build. Returns
+    {output path: fingerprinted path}.
+    """
+    fingerprints = {}
+    for path in paths:
+        path = Path(path)
+        if path.suffix.lower() not in FINGERPRINT_SUFFIXES or not path.is_file():
+            continue
+
+        target = fingerprinted_path(path, hash_file(path))
+        if not target.exists():
+            transfer_file(path, target, "hardlink")
+        fingerprints[os.path.normpath(path)] = target
+
+    return fingerprints
+
+def asset_urls(fingerprints, public_dir):
+    """Turn {output path: fingerprinted path} into {URL: fingerprinted URL}"""
+    def url(path):
+        return "/" + Path(path).relative_to(public_dir).as_posix()
+    return {url(path): url(target) for path, target in fingerprints.items()}
+
+def write_asset_manifest(urls, public_dir):
+    """Write the URL -> fingerprinted URL map (for deploy tooling and cache header rules)"""
+    manifest_path = Path(public_dir) / ASSET_MANIFEST_FILE
+    write_file(manifest_path, json.dumps(urls, sort_keys=True, indent=2))
+    return manifest_path
+
+@pass_context
+def asset_filter(context, url):
+    """Jinja filter: {{ '/styles.css' | asset }} -> fingerprinted URL when fingerprinting is enabled"""
+    return context.get('asset_urls', {}).get(url, url)
+
+def rewrite_asset_urls(html, page_dir, fingerprints, public_dir):
+    """
+    Point src, href and srcset attributes of rendered HTML at fingerprinted assets.
+
+    `page_dir` is the output directory of the page (relative URLs resolve
+    against it); site-absolute URLs resolve against `public_dir`. Relative
+    URLs stay relative.
+    """
+    if not fingerprints:
+        return html
+
+    def rewrite_url(url):
+        if url.startswith(('http://', 'https://', '//', 'data:', '#', 'mailto:')):
+            return url
+
+        path, _, fragment = url.partition('#')
+        if path.startswith('/'):
+            output_path = os.path.normpath(os.path.join(public_dir, path.lstrip('/')))
+        else:
+            output_path = os.path.normpath(os.path.join(page_dir, path))
+
+        target = fingerprints.get(output_path)
+        if target is None:
+            return url
+
+        url = posixpath.join(posixpath.dirname(path), target.name)
+        return f"{url}#{fragment}" if fragment else url
+
+    def replace_attribute(match):
+        name, value = match.groups()
+        if name == 'srcset':
+            candidates = []
+            for candidate in value.split(','):
+                parts = candidate.strip().split(' ', 1)
+                parts[0] = rewrite_url(parts[0])
+                candidates.append(' '.join(parts))
+            value = ", ".join(candidates)
+        else:
+            value = rewrite_url(value)
+        return f'{name}="{value}"'
+
+    return URL_ATTR_PATTERN.sub(replace_attribute, html)
@@ -0,0 +1,159 @@
+"""
+images.py - Convert raster content images to responsive WebP variants
+"""
+
+import io
+import os
+import re
+import json
+import posixpath
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils import hash_data, hash_file, write_file
+
+RASTER_SUFFIXES = {'.png', '.jpg', '.jpeg'}
+IMAGE_WIDTHS = (360, 720, 1440)  # 720px is the content width in styles.css, 1440px covers 2x displays
+IMAGE_SIZES = "(max-width: 720px) 100vw, 720px"
+WEBP_QUALITY = 80
+
+IMG_TAG_PATTERN = re.compile(r'<img\b([^>]*?)\bsrc="([^"]+)"([^>]*)>')
+WIDTH_ATTR_PATTERN = re.compile(r'\bwidth="(\d+)"')
+
+
+def pillow_available():
+    """Check whether Pillow (the optional image dependency) is installed"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def variant_path(image_path, width):
+    """Output path of the WebP variant of an image at a given width"""
+    image_path = Path(image_path)
+    return image_path.with_name(f"{image_path.stem}-{width}w.webp")
+
+def variant_widths(original_width):
+    """Widths to generate: the configured ones that do not upscale, plus the original width"""
+    widths = [width for width in IMAGE_WIDTHS if width < original_width]
+    if original_width <= IMAGE_WIDTHS[-1]:
+        widths.append(original_width)
+    return widths
+
+def encode_variants(image_path, cache):
+    """
+    Write the WebP variants of an image next to it, returns [(variant path, width)].
+
+    Encoded variants are stored in the cache under the source hash, so an
+    unchanged image is never decoded or re-encoded.
+    """
+    import PIL
+    from PIL import Image
+
+    settings = {'source': hash_file(image_path), 'quality': WEBP_QUALITY, 'pillow': PIL.__version__}
+    index_key = hash_data({**settings, 'widths': IMAGE_WIDTHS})
+
+    cached_index = cache.get(index_key)
+    if cached_index is not None:
+        widths = json.loads(cached_index)
+        encoded = {width: cache.get(hash_data({**settings, 'width': width})) for width in widths}
+    else:
+        encoded = {}
+
+    if cached_index is None or any(data is None for data in encoded.values()):
+        with Image.open(image_path) as image:
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+            widths = variant_widths(image.width)
+
+            for width in widths:
+                height = max(1, round(image.height * width / image.width))
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+                buffer = io.BytesIO()
+                resized.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+                encoded[width] = buffer.getvalue()
+                cache.set(hash_data({**settings, 'width': width}), encoded[width])
+
+        cache.set(index_key, json.dumps(widths).encode('utf-8'))
+
+    variants = []
+    for width in widths:
+        output_path = variant_path(image_path, width)
+        data = encoded[width]
+
+        # Leave identical variants from a previous build untouched
+        if not (output_path.exists() and output_path.read_bytes() == data):
+            write_file(output_path, data)
+
+        variants.append((output_path, width))
+
+    return variants
+
+def _encode_job(job):
+    image_path, cache = job
+    return image_path, encode_variants(image_path, cache)
+
+def optimize_images(image_paths, cache, jobs=1):
+    """
+    Generate WebP variants for every raster image in `image_paths`.
+
+    Returns {image path: [(variant path, width), ...]}. Encoding runs on a
+    process pool when `jobs` > 1.
+    """
+    images = [Path(path) for path in image_paths if Path(path).suffix.lower() in RASTER_SUFFIXES]
+    if not images:
+        return {}
+
+    if not pillow_available():
+        print("Warning: Pillow is not installed, content images are published without WebP variants "
+              "(install the `images` extra: poetry install --extras images)")
+        return {}
+
+    job_args = [(image_path, cache) for image_path in images]
+    if jobs <= 1 or len(images) <= 1:
+        results = list(map(_encode_job, job_args))
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(_encode_job, job_args))
+
+    return {os.path.normpath(image_path): image_variants for image_path, image_variants in results}
+
+def responsive_images(html, page_dir, variants, public_dir):
+    """
+    Wrap <img> tags that point at optimized images in <picture> with a WebP srcset.
+
+    `page_dir` is the output directory of the page (relative `src` attributes
+    resolve against it); site-absolute sources resolve against `public_dir`.
+    """
+    if not variants:
+        return html
+
+    def replace_image(match):
+        src = match.group(2)
+        if src.startswith(('http://', 'https://', '//', 'data:')):
+            return match.group(0)
+
+        if src.startswith('/'):
+            image_path = os.path.normpath(os.path.join(public_dir, src.lstrip('/')))
+        else:
+            image_path = os.path.normpath(os.path.join(page_dir, src))
+
+        image_variants = variants.get(image_path)
+        if not image_variants:
+            return match.group(0)
+
+        src_dir = posixpath.dirname(src)
+        srcset = ", ".join(
+            f"{posixpath.join(src_dir, path.name)} {width}w" for path, width in image_variants
+        )
+
+        width = WIDTH_ATTR_PATTERN.search(match.group(0))
+        sizes = f"{width.group(1)}px" if width else IMAGE_SIZES
+
+        return (
+            f'<picture><source type="image/webp" srcset="{srcset}" sizes="{sizes}">'
+            f'{match.group(0)}</picture>'
+        )
+
+    return IMG_TAG_PATTERN.sub(replace_image, html)
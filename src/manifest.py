@@ -0,0 +1,186 @@
+"""
+manifest.py - Dependency manifest that lets incremental builds skip untouched outputs
+"""
+
+import json
+import os
+from pathlib import Path
+from jinja2 import meta
+
+from src.page import Page, to_json
+from src.utils import ensure_dir, hash_data, hash_file
+
+MANIFEST_VERSION = 2
+
+def template_closure(env, name):
+    """
+    Return (template names, context variables) involved in rendering a template.
+
+    Follows extends/include/import references, so the names cover the layout,
+    its parents, includes and imported macros.
+    """
+    templates = set()
+    variables = set()
+    pending = [name]
+
+    while pending:
+        current = pending.pop()
+        if current in templates:
+            continue
+        templates.add(current)
+
+        ast = env.parse_template(current)
+        variables |= meta.find_undeclared_variables(ast)
+        pending.extend(ref for ref in meta.find_referenced_templates(ast) if ref)
+
+    return sorted(templates), variables
+
+class BuildManifest:
+    """
+    Map every output file to the hashes of the inputs it was built from.
+
+    An output's inputs are its markdown source, the closure of templates it
+    renders (layout, parents, includes and imported macros) and every context
+    variable those templates actually read (site config, page, posts, tags,
+    nav, ...). Outputs whose inputs hash the same as in the previous build are
+    left untouched; outputs that are not produced anymore get deleted.
+
+    Outputs are keyed by their path relative to `root`, so the same manifest
+    applies whether the site is built in place or in a staging directory.
+    """
+
+    def __init__(self, path, env, root, reuse=True):
+        self.path = Path(path)
+        self.env = env
+        self.root = Path(root)
+        self.previous = self._load() if reuse else {}
+        self.current = {}
+        self._template_deps = {}
+        self._hashes = {}
+
+    def _load(self):
+        """Load the manifest written by the previous build (if any)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+
+        return data.get('outputs', {})
+
+    def template_dependencies(self, name):
+        """Return (template names, context variables) read when rendering a template"""
+        if name not in self._template_deps:
+            self._template_deps[name] = template_closure(self.env, name)
+        return self._template_deps[name]
+
+    def _hash_template(self, name):
+        key = ('template', name)
+        if key not in self._hashes:
+            filename = self.env.loader.get_source(self.env, name)[1]
+            self._hashes[key] = hash_file(filename)
+        return self._hashes[key]
+
+    def _serialize(self, value):
+        """
+        Hash output paths relative to the root, so staged and in-place builds agree.
+
+        Pages inside a value are hashed by their listing fields (title, URL,
+        date, metadata, related posts), which leaves their body out.
+        """
+        if isinstance(value, Path) and self.root in value.parents:
+            return value.relative_to(self.root).as_posix()
+        if isinstance(value, Page):
+            return value.listing()
+        return to_json(value)
+
+    def hash_value(self, value):
+        """Hash a context value, memoized by identity since collections are shared between pages"""
+        key = ('value', id(value))
+        if key not in self._hashes:
+            self._hashes[key] = (hash_data(value, self._serialize), value)
+        return self._hashes[key][0]
+
+    def inputs_for(self, template_name, context, source=None, overrides=None):
+        """
+        Compute the input hashes of an output rendered from a template.
+
+        `overrides` (the page, its posts and pagination) take precedence over
+        the shared `context`. They belong to a single output, so they are hashed
+        as they come instead of being memoized (and kept alive) like the
+        shared collections. The output's own `page` is hashed with all its
+        fields, including `content_digest`; any other page only by its listing.
+        """
+        overrides = overrides or {}
+        templates, variables = self.template_dependencies(template_name)
+
+        inputs = {
+            'templates': hash_data([(name, self._hash_template(name)) for name in templates])
+        }
+
+        if source is not None:
+            inputs['source'] = hash_file(source)
+
+        for variable in sorted(variables):
+            if variable == 'page' and isinstance(overrides.get(variable), Page):
+                inputs[variable] = hash_data(overrides[variable].to_dict(), self._serialize)
+            elif variable in overrides:
+                inputs[variable] = hash_data(overrides[variable], self._serialize)
+            elif variable in context:
+                inputs[variable] = self.hash_value(context[variable])
+
+        return {
+            'inputs': inputs,
+            'source': str(source) if source is not None else None,
+            'templates': templates
+        }
+
+    def key(self, output_path):
+        return Path(output_path).relative_to(self.root).as_posix()
+
+    def outputs(self):
+        """Paths of every output registered by the current build"""
+        return [self.root / key for key in self.current]
+
+    def is_fresh(self, output_path, entry):
+        """Check whether an output exists and was built from the same inputs"""
+        previous = self.previous.get(self.key(output_path))
+        if previous is None or not Path(output_path).exists():
+            return False
+        return previous.get('inputs') == entry['inputs']
+
+    def record(self, output_path, entry=None):
+        """Register an output produced by the current build"""
+        self.current[self.key(output_path)] = entry or {'inputs': {}, 'source': None, 'templates': []}
+
+    def remove_stale(self):
+        """Delete outputs of the previous build that the current build no longer produces"""
+        root = self.root
+        removed = 0
+        for key in self.previous:
+            if key in self.current:
+                continue
+
+            path = root / key
+            if path.is_file():
+                path.unlink()
+                removed += 1
+
+            # Clean up directories left empty by the removal
+            parent = path.parent
+            while parent != root and root in parent.parents and parent.is_dir() and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+
+        return removed
+
+    def save(self):
+        """Persist the manifest for the next build"""
+        ensure_dir(self.path.parent)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'outputs': self.current}, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
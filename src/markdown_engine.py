@@ -0,0 +1,136 @@
+"""
+markdown_engine.py - Reusable Markdown converter with LaTeX and image width extensions
+
+Rendered HTML is cached by render_markdown: bump MARKDOWN_RENDERER_VERSION
+(utils.py) whenever a change here alters the output.
+"""
+
+import re
+import markdown
+from markdown.extensions import Extension
+from markdown.preprocessors import Preprocessor
+from markdown.postprocessors import Postprocessor
+
+BLOCK_LATEX_PATTERN = re.compile(r'(?<!\\)\$\$(.*?)(?<!\\)\$\$', re.DOTALL)
+INLINE_LATEX_PATTERN = re.compile(r'(?<!\\)\$(.*?)(?<!\\)\$')
+IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\((.*?)\)')
+IMAGE_WIDTH_PATTERN = re.compile(r'<img (.*?)><!-- img-width:(\d+) -->')
+PLACEHOLDER_PATTERN = re.compile(r'LATEX_(?:BLOCK|INLINE)_\d+_')
+
+# Converter reused across documents (one per process)
+_engine = None
+
+
+class LatexPreprocessor(Preprocessor):
+    """
+    Swap LaTeX for placeholders before Markdown sees it (preserved for later JS rendering).
+
+    Block math ($$...$$) is replaced first, then inline math ($...$); the
+    original source is kept in `md.latex_placeholders`.
+    """
+
+    def run(self, lines):
+        placeholders = self.md.latex_placeholders
+        text = "\n".join(lines)
+
+        def replace(kind):
+            def replace_match(match):
+                placeholder = f"LATEX_{kind}_{len(placeholders)}_"
+                placeholders[placeholder] = match.group(0)
+                return placeholder
+            return replace_match
+
+        text = BLOCK_LATEX_PATTERN.sub(replace("BLOCK"), text)
+        text = INLINE_LATEX_PATTERN.sub(replace("INLINE"), text)
+        return text.split("\n")
+
+class ImageWidthPreprocessor(Preprocessor):
+    """Turn the custom image syntax ![alt|width](src) into a standard image plus a width marker"""
+
+    def run(self, lines):
+        def process_image(match):
+            alt_width = match.group(1)
+            src = match.group(2)
+
+            # Check if there's a width specification
+            if '|' in alt_width:
+                alt, width = alt_width.rsplit('|', 1)
+                # Try to parse width as number (strip 'px' if present)
+                width = width.strip()
+                if width.endswith('px'):
+                    width = width[:-2]
+
+                # If width is a valid number, add the width marker
+                if width.isdigit():
+                    return f'![{alt}]({src})<!-- img-width:{width} -->'
+
+            # If no width specification or invalid format, return unchanged
+            return f'![{alt_width}]({src})'
+
+        return IMAGE_PATTERN.sub(process_image, "\n".join(lines)).split("\n")
+
+class ImageWidthPostprocessor(Postprocessor):
+    """Move width markers into the width attribute of the preceding <img>"""
+
+    def run(self, text):
+        def add_image_width(match):
+            img_tag = match.group(1)
+            width = match.group(2)
+
+            # If img tag already has a width attribute, don't modify
+            if 'width=' in img_tag:
+                return f'<img {img_tag}>'
+
+            return f'<img {img_tag} width="{width}">'
+
+        return IMAGE_WIDTH_PATTERN.sub(add_image_width, text)
+
+class LatexPostprocessor(Postprocessor):
+    """Put the LaTeX source back in place of its placeholders, in a single scan of the output"""
+
+    def run(self, text):
+        placeholders = self.md.latex_placeholders
+        if not placeholders:
+            return text
+        return PLACEHOLDER_PATTERN.sub(lambda match: placeholders.get(match.group(0), match.group(0)), text)
+
+class BlogExtension(Extension):
+    """
+    LaTeX passthrough and ![alt|width](src) images.
+
+    The preprocessors run on the raw source before any built-in one (so math
+    inside code blocks is preserved verbatim, as before), and the
+    postprocessors run after the built-in ones.
+    """
+
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        self.md = md
+        md.latex_placeholders = {}
+
+        md.preprocessors.register(LatexPreprocessor(md), 'latex', 40)
+        md.preprocessors.register(ImageWidthPreprocessor(md), 'image_width', 35)
+        md.postprocessors.register(ImageWidthPostprocessor(md), 'image_width', 10)
+        md.postprocessors.register(LatexPostprocessor(md), 'latex', 5)
+
+    def reset(self):
+        self.md.latex_placeholders = {}
+
+def create_engine(extensions, extension_configs):
+    """Create a Markdown converter with the blog extension on top of the given extensions"""
+    return markdown.Markdown(
+        extensions=[*extensions, BlogExtension()],
+        extension_configs=extension_configs
+    )
+
+def convert(text, extensions, extension_configs):
+    """
+    Render markdown with the shared converter.
+
+    The converter (and its extensions) is built once per process and reset
+    between documents instead of being recreated for every page.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(extensions, extension_configs)
+    return _engine.reset().convert(text)
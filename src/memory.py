@@ -0,0 +1,99 @@
+"""
+memory.py - In-memory output store and WSGI app used by the development server
+"""
+
+import mimetypes
+import posixpath
+from pathlib import Path
+from urllib.parse import unquote
+
+# Source files that never end up in the output (mirrors copy_content_assets)
+HIDDEN_SUFFIXES = {'.md', '.markdown'}
+
+
+class MemoryStore:
+    """
+    Hold rendered outputs keyed by URL instead of writing them under public/.
+
+    Outputs are addressed by the same paths a disk build would write
+    (public/blog/post/index.html) and stored under their URL
+    (/blog/post/index.html), so the build code does not need to know where
+    its output goes.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.files = {}
+
+    def url_for(self, output_path):
+        """URL under which an output path is served"""
+        return "/" + Path(output_path).relative_to(self.root).as_posix()
+
+    def write(self, output_path, content):
+        """Store an output (str or bytes)"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self.files[self.url_for(output_path)] = content
+
+    def remove(self, output_path):
+        """Drop an output that is not produced anymore"""
+        self.files.pop(self.url_for(output_path), None)
+
+    def clear(self):
+        self.files.clear()
+
+    def get(self, url):
+        """Return the stored bytes for a URL, or None"""
+        if url.endswith("/"):
+            url += "index.html"
+        return self.files.get(url)
+
+def find_source_file(url, source_dirs):
+    """Map a URL to an asset in one of the source directories (first match wins)"""
+    relative = posixpath.normpath(url).lstrip("/")
+    if relative in ("", ".") or relative.startswith(".."):
+        return None
+
+    for source_dir in source_dirs:
+        path = Path(source_dir) / relative
+        if path.is_file() and path.suffix.lower() not in HIDDEN_SUFFIXES \
+                and not any(part.startswith(".") for part in path.parts):
+            return path
+
+    return None
+
+def create_app(store, source_dirs, not_found="/404.html"):
+    """
+    WSGI app serving rendered pages from `store` and assets straight from `source_dirs`.
+
+    Directory URLs resolve to their index.html (redirecting to the trailing
+    slash so relative asset links keep working); unknown URLs get the
+    rendered 404 page.
+    """
+    def app(environ, start_response):
+        url = unquote(environ.get('PATH_INFO') or "/")
+
+        body = store.get(url)
+        content_type = mimetypes.guess_type(url if not url.endswith("/") else "index.html")[0]
+
+        if body is None:
+            source_path = find_source_file(url, source_dirs)
+            if source_path is not None:
+                body = source_path.read_bytes()
+
+        if body is None and not url.endswith("/") and store.get(url + "/") is not None:
+            start_response('301 Moved Permanently', [('Location', url + "/")])
+            return [b""]
+
+        if body is None:
+            start_response('404 Not Found', [('Content-Type', 'text/html; charset=utf-8')])
+            return [store.get(not_found) or b"Not Found"]
+
+        headers = [('Content-Type', content_type or 'application/octet-stream'), ('Cache-Control', 'no-cache')]
+        if content_type and content_type.startswith('text/'):
+            headers[0] = ('Content-Type', f"{content_type}; charset=utf-8")
+
+        start_response('200 OK', headers)
+        return [body]
+
+    return app
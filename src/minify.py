@@ -0,0 +1,131 @@
+"""
+minify.py - Whitespace and comment minification of rendered HTML and CSS
+"""
+
+import re
+
+from src.utils import hash_data
+
+MINIFY_VERSION = 2  # bump when the output of the minifiers changes (invalidates the cache)
+
+# Kept verbatim: preformatted and raw-text elements, inline code and every LaTeX delimiter KaTeX renders
+HTML_TOKEN_PATTERN = re.compile(
+    r'(?P<raw><(?P<element>pre|textarea|script|style|code)\b.*?</(?P=element)\s*>)'
+    r'|(?P<comment><!--.*?-->)'
+    r'|(?P<latex>(?<!\\)\$\$.*?(?<!\\)\$\$|\\\[.*?\\\]|\\\(.*?\\\)|(?<!\\)\$[^$\n]+?(?<!\\)\$)'
+    r'|(?P<tag><[^>]*>)',
+    re.DOTALL | re.IGNORECASE
+)
+STYLE_PATTERN = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.DOTALL | re.IGNORECASE)
+TAG_NAME_PATTERN = re.compile(r'</?([a-zA-Z][a-zA-Z0-9]*)')
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r\f]+')  # not \s, which would also eat non-breaking spaces
+
+# Whitespace next to these tags is never rendered, so it can be dropped entirely
+BLOCK_TAGS = frozenset("""
+    html head body title meta link base div p ul ol li dl dt dd nav header footer main section article aside
+    h1 h2 h3 h4 h5 h6 table thead tbody tfoot tr td th caption figure figcaption blockquote hr br form
+    fieldset legend details summary
+""".split())
+
+CSS_TOKEN_PATTERN = re.compile(
+    r'(?P<string>"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'
+    r'|(?P<comment>/\*(?!!).*?\*/)',
+    re.DOTALL
+)
+CSS_PUNCTUATION_PATTERN = re.compile(r'\s*([{};,>])\s*')
+CSS_COLON_PATTERN = re.compile(r':\s+')
+CSS_PLACEHOLDER_PATTERN = re.compile(r'\x00(\d+)\x00')
+
+
+def is_block_tag(tag):
+    match = TAG_NAME_PATTERN.match(tag)
+    return bool(match) and match.group(1).lower() in BLOCK_TAGS
+
+def minify_html(html, cache=None):
+    """
+    Collapse whitespace and drop comments in rendered HTML.
+
+    Runs of whitespace become a single space, and are removed next to
+    block-level tags where they are never rendered. <pre>, <code>,
+    <textarea>, <script> and LaTeX are left untouched; <style> contents
+    go through minify_css. Conditional comments (<!--[if ...]>) are kept.
+    When a `DiskCache` is given, results are cached by content hash.
+    """
+    if cache is not None:
+        key = hash_data({'html': html, 'minify': MINIFY_VERSION})
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.decode('utf-8')
+
+        minified = minify_html(html)
+        cache.set(key, minified.encode('utf-8'))
+        return minified
+
+    # Split into (kind, text) tokens; everything between matches is text
+    tokens = []
+    position = 0
+    for match in HTML_TOKEN_PATTERN.finditer(html):
+        if match.start() > position:
+            tokens.append(('text', html[position:match.start()]))
+        kind = match.lastgroup if match.lastgroup != 'element' else 'raw'
+        tokens.append((kind, match.group(0)))
+        position = match.end()
+    if position < len(html):
+        tokens.append(('text', html[position:]))
+
+    tokens = [
+        (kind, text) for kind, text in tokens
+        if kind != 'comment' or text.startswith('<!--[if')
+    ]
+
+    output = []
+    for index, (kind, text) in enumerate(tokens):
+        if kind == 'raw' and text[:6].lower() == '<style':
+            text = STYLE_PATTERN.sub(lambda match: match.group(1) + minify_css(match.group(2)) + match.group(3), text)
+        elif kind == 'text':
+            text = WHITESPACE_PATTERN.sub(' ', text)
+
+            previous = tokens[index - 1] if index > 0 else None
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if previous is None or (previous[0] == 'tag' and is_block_tag(previous[1])):
+                text = text.lstrip(' ')
+            if following is None or (following[0] == 'tag' and is_block_tag(following[1])):
+                text = text.rstrip(' ')
+
+        output.append(text)
+
+    return ''.join(output)
+
+def minify_css(css, cache=None):
+    """
+    Drop comments (except /*! ... */ notices) and unneeded whitespace in a stylesheet.
+
+    Strings are left untouched. Whitespace is only removed around { } ; , >
+    and after colons, so selectors such as `a :hover` and expressions inside
+    calc() keep their meaning.
+    """
+    if cache is not None:
+        key = hash_data({'css': css, 'minify': MINIFY_VERSION})
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.decode('utf-8')
+
+        minified = minify_css(css)
+        cache.set(key, minified.encode('utf-8'))
+        return minified
+
+    # Set strings aside and turn comments into whitespace before squeezing
+    strings = []
+
+    def protect(match):
+        if match.lastgroup == 'comment':
+            return ' '
+        strings.append(match.group(0))
+        return f"\x00{len(strings) - 1}\x00"
+
+    css = CSS_TOKEN_PATTERN.sub(protect, css)
+    css = WHITESPACE_PATTERN.sub(' ', css)
+    css = CSS_PUNCTUATION_PATTERN.sub(r'\1', css)
+    css = CSS_COLON_PATTERN.sub(':', css).replace(';}', '}').strip()
+
+    return CSS_PLACEHOLDER_PATTERN.sub(lambda match: strings[int(match.group(1))], css)
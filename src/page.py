@@ -0,0 +1,186 @@
+"""
+page.py - Pages loaded metadata-first, with the body rendered only when it is read
+"""
+
+import re
+from contextlib import contextmanager
+
+from src import profiler
+from src.utils import render_markdown, markdown_cache_key, hash_file
+
+FRONTMATTER_DELIMITERS = {'---', '+++'}  # YAML and TOML blocks (what python-frontmatter detects by default)
+DELIMITER_PATTERN = re.compile(r'^(-{3,}|\+{3,})\s*$')
+PAGE_FIELDS = (
+    'title', 'date', 'date_formatted', 'content_digest', 'url', 'output_path', 'source_path', 'metadata',
+    'is_post', 'is_index', 'section', 'level', 'layout', 'related'
+)
+OPTIONAL_FIELDS = ('related',)  # left out of the page (and its hash) until set
+# What listings of other pages (posts, tags, sections, nav) can show about a page
+LISTING_FIELDS = ('title', 'date', 'date_formatted', 'url', 'metadata', 'is_post', 'is_index', 'section', 'level',
+                  'layout', 'related')
+YAML_BOUNDARY = re.compile(r'^-{3,}\s*$', re.MULTILINE)  # python-frontmatter's YAML delimiter
+
+
+def read_frontmatter(path):
+    """
+    Parse the metadata of a content file, reading no further than its frontmatter block.
+
+    Files that do not open with a YAML or TOML block are handed to
+    python-frontmatter as a whole, so any other format it detects still works.
+    """
+    import frontmatter
+
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        first_line = f.readline()
+        match = DELIMITER_PATTERN.match(first_line)
+        if match is None or match.group(1)[:3] not in FRONTMATTER_DELIMITERS:
+            return frontmatter.load(str(path)).metadata
+
+        lines = [first_line]
+        for line in f:
+            lines.append(line)
+            if DELIMITER_PATTERN.match(line) and line.strip()[0] == first_line.strip()[0]:
+                return frontmatter.loads(''.join(lines)).metadata
+
+    return {}  # unterminated block: python-frontmatter treats the whole file as body too
+
+def read_body(path):
+    """
+    The markdown body of a content file (without its frontmatter).
+
+    A YAML block is cut off the way python-frontmatter splits it, without
+    parsing it again; other formats are left to python-frontmatter.
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        text = f.read().strip()
+
+    if YAML_BOUNDARY.match(text):
+        parts = YAML_BOUNDARY.split(text, 2)
+        return parts[2].strip() if len(parts) == 3 else text
+
+    import frontmatter
+
+    return frontmatter.loads(text).content
+
+def content_digest(path):
+    """
+    Identify the rendered body of a file without rendering it.
+
+    Same inputs as the markdown cache key (renderer version, extension setup
+    and library versions), with the hash of the file in place of its text.
+    """
+    return markdown_cache_key(hash_file(path))
+
+class Page:
+    """
+    A content page: a compact record of its metadata that renders its body on access.
+
+    Pages are the bulk of what a build keeps in memory, so they are slotted
+    records rather than dicts (PAGE_FIELDS, plus the cache and transforms
+    used for rendering). They still read like the dicts they replace:
+    `page['title']`, `page.get(...)`, `'related' in page`, and templates use
+    `page.title` as before. `related` is only present once set.
+
+    `page.content` (and `page['content']`) renders the markdown body through
+    the markdown cache and then applies the transforms added with
+    `add_transform` (responsive images, fingerprinted URLs). The HTML is only
+    kept inside `rendering_once(page)`, for the templates that read it several
+    times; otherwise every read renders again, which is a cache read once the
+    body was rendered, so a build only holds metadata for the whole site.
+    `content_digest` stands for the body in hashes (the manifest and the term
+    vector cache), so unchanged pages never need their HTML at all. Only
+    the page's own outputs hash it: collections hash the `listing` of their
+    pages, so editing a body does not touch every listing the page is in.
+
+    Pages pickle with their cache and transforms, so render workers render
+    the bodies they need themselves.
+    """
+
+    __slots__ = PAGE_FIELDS + ('markdown_cache', 'transforms', '_keep', '_html')
+
+    def __init__(self, fields, markdown_cache=None):
+        unknown = set(fields) - set(PAGE_FIELDS)
+        if unknown:
+            raise KeyError(f"Unknown page fields: {', '.join(sorted(unknown))}")
+
+        for name in PAGE_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.markdown_cache = markdown_cache
+        self.transforms = []
+        self._keep = False
+        self._html = None
+
+    def add_transform(self, function, *args):
+        """Post-process the rendered body with function(html, *args)"""
+        self.transforms.append((function, args))
+
+    def render(self):
+        """Render the body to HTML"""
+        with profiler.step("render_markdown", self.source_path):
+            html = render_markdown(read_body(self.source_path), cache=self.markdown_cache)
+
+        for function, args in self.transforms:
+            html = function(html, *args)
+        return html
+
+    @property
+    def content(self):
+        if self._html is not None:
+            return self._html
+
+        html = self.render()
+        if self._keep:
+            self._html = html
+        return html
+
+    def keys(self):
+        return [name for name in PAGE_FIELDS if name in self]
+
+    def to_dict(self):
+        """The fields of the page as a dict (what gets dumped to data.json, and hashed for the page's own output)"""
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def listing(self):
+        """The LISTING_FIELDS of the page as a dict (what collections of pages are hashed by)"""
+        return {name: getattr(self, name) for name in LISTING_FIELDS if name in self}
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        if key in OPTIONAL_FIELDS:
+            return getattr(self, key) is not None
+        return key == 'content' or key in PAGE_FIELDS
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in PAGE_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __repr__(self):
+        return f"Page({self.source_path})"
+
+@contextmanager
+def rendering_once(page):
+    """Render the body of `page` at most once inside the block (anything but a Page is left alone)"""
+    if not isinstance(page, Page):
+        yield
+        return
+
+    page._keep = True
+    try:
+        yield
+    finally:
+        page._keep = False
+        page._html = None
+
+def to_json(value):
+    """`default` for json.dump/hash_data: pages as their fields, anything else as a string"""
+    if isinstance(value, Page):
+        return value.to_dict()
+    return str(value)
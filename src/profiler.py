@@ -0,0 +1,156 @@
+"""
+profiler.py - Per-phase and per-page timing and allocation report for builds
+"""
+
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from src.utils import ensure_dir
+
+# Profiler collecting spans for the current build (None when not profiling)
+_active = None
+
+
+class BuildProfiler:
+    """
+    Record wall time and memory allocation of build phases and per-page steps.
+
+    Phases (sync, assets, content, render, ...) run one after another and also
+    record their peak traced memory. Steps (parse, render_markdown, template,
+    write) are recorded per page inside the phases. Allocation figures are the
+    net bytes still allocated when the span ends, as seen by tracemalloc.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.steps = []
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        tracemalloc.start()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        tracemalloc.stop()
+
+    def _offset(self, start):
+        return (start - self.started) * 1e6  # microseconds since the start of the build
+
+    @contextmanager
+    def phase(self, name):
+        """Time a build phase"""
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            self.phases.append({
+                'name': name,
+                'start': self._offset(start),
+                'seconds': seconds,
+                'allocated': current - memory_before,
+                'peak': peak - memory_before
+            })
+
+    @contextmanager
+    def step(self, name, page):
+        """Time one step (parse, render_markdown, template, write) of one page"""
+        memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.steps.append({
+                'name': name,
+                'page': str(page),
+                'start': self._offset(start),
+                'seconds': seconds,
+                'allocated': tracemalloc.get_traced_memory()[0] - memory_before
+            })
+
+    def step_totals(self):
+        """Aggregate steps by name: {name: {'count', 'seconds', 'allocated'}}"""
+        totals = {}
+        for step in self.steps:
+            total = totals.setdefault(step['name'], {'count': 0, 'seconds': 0.0, 'allocated': 0})
+            total['count'] += 1
+            total['seconds'] += step['seconds']
+            total['allocated'] += step['allocated']
+        return totals
+
+    def save(self, path):
+        """
+        Write the trace as JSON.
+
+        Spans are stored as Chrome trace events (open the file in
+        chrome://tracing or https://ui.perfetto.dev), alongside the raw
+        phase/step records and per-step totals.
+        """
+        events = [
+            {'name': phase['name'], 'cat': 'phase', 'ph': 'X', 'ts': phase['start'],
+             'dur': phase['seconds'] * 1e6, 'pid': os.getpid(), 'tid': 0,
+             'args': {'allocated': phase['allocated'], 'peak': phase['peak']}}
+            for phase in self.phases
+        ] + [
+            {'name': f"{step['name']} {step['page']}", 'cat': step['name'], 'ph': 'X', 'ts': step['start'],
+             'dur': step['seconds'] * 1e6, 'pid': os.getpid(), 'tid': 1,
+             'args': {'page': step['page'], 'allocated': step['allocated']}}
+            for step in self.steps
+        ]
+
+        ensure_dir(os.path.dirname(path) or ".")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'traceEvents': events,
+                'seconds': self.elapsed,
+                'phases': self.phases,
+                'steps': self.steps,
+                'totals': self.step_totals()
+            }, f, indent=2)
+
+    def report(self, top=10):
+        """Print the phase breakdown and the `top` slowest page steps"""
+        print(f"\nBuild profile ({self.elapsed:.3f}s total)")
+        print(f"  {'phase':<16} {'time':>9} {'share':>6} {'allocated':>11} {'peak':>11}")
+        for phase in sorted(self.phases, key=lambda phase: phase['seconds'], reverse=True):
+            share = phase['seconds'] / self.elapsed * 100 if self.elapsed else 0
+            print(f"  {phase['name']:<16} {phase['seconds']:>8.3f}s {share:>5.1f}% "
+                  f"{format_bytes(phase['allocated']):>11} {format_bytes(phase['peak']):>11}")
+
+        print(f"\n  {'step':<16} {'count':>6} {'time':>9} {'allocated':>11}")
+        for name, total in sorted(self.step_totals().items(), key=lambda item: item[1]['seconds'], reverse=True):
+            print(f"  {name:<16} {total['count']:>6} {total['seconds']:>8.3f}s {format_bytes(total['allocated']):>11}")
+
+        print(f"\n  Slowest {top} page steps:")
+        for step in sorted(self.steps, key=lambda step: step['seconds'], reverse=True)[:top]:
+            print(f"  {step['seconds']:>8.3f}s {format_bytes(step['allocated']):>11}  {step['name']:<16} {step['page']}")
+
+def format_bytes(size):
+    """Human-readable byte count (signed, since a span can free more than it allocates)"""
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def activate(profiler):
+    """Make `profiler` collect the spans of the following build (None to disable)"""
+    global _active
+    _active = profiler
+
+def phase(name):
+    """Context manager timing a build phase (no-op when not profiling)"""
+    return _active.phase(name) if _active is not None else nullcontext()
+
+def step(name, page):
+    """Context manager timing a per-page step (no-op when not profiling)"""
+    return _active.step(name, page) if _active is not None else nullcontext()
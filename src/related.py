@@ -0,0 +1,252 @@
+"""
+related.py - Related posts from shared tags and TF-IDF similarity of the post text
+"""
+
+import math
+from collections import Counter
+
+from src.search_index import term_vector
+from src.utils import slugify
+
+DEFAULT_RELATED_POSTS = 3
+TAG_WEIGHT = 0.4           # share of the score from shared tags, the rest comes from the text
+SCORE_DIGITS = 6           # scores are rounded so that float noise never reorders posts
+MAX_TERMS = 64             # highest-weighted terms kept per post
+SCORE_BLOCK_ROWS = 256     # rows of the score matrix computed at once (NumPy)
+SCORE_BLOCK_POSTINGS = 1 << 20  # postings expanded at once for a block of rows (NumPy)
+
+
+def numpy_available():
+    """Check whether NumPy (the optional dependency that vectorizes the similarity) is installed"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def post_tags(post):
+    return sorted({slugify(tag) for tag in post.get('metadata', {}).get('tags', []) or []})
+
+def _sparse_rows(rows, columns):
+    """Sparse (CSR) form of [{key: value}] as (indptr, indices, data), keeping the keys in `columns`"""
+    import numpy as np
+
+    indptr, indices, data = [0], [], []
+    for row in rows:
+        for key, value in row.items():
+            if key in columns:
+                indices.append(columns[key])
+                data.append(value)
+        indptr.append(len(indices))
+    return np.array(indptr), np.array(indices, dtype=np.int64), np.array(data, dtype=float)
+
+def _transpose(indptr, indices, data, column_count):
+    """Sparse form of the transposed matrix (the postings of every column)"""
+    import numpy as np
+
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    by_column = np.argsort(indices, kind='stable')
+    column_indptr = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=column_count))))
+    return column_indptr, rows[by_column], data[by_column]
+
+def _posting_counts(matrix, transposed):
+    """Number of postings each row expands to in `_block_product`"""
+    import numpy as np
+
+    indptr, indices, _ = matrix
+    column_indptr = transposed[0]
+    lengths = np.diff(column_indptr)[indices]
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return np.bincount(rows, weights=lengths, minlength=len(indptr) - 1)
+
+def _row_blocks(costs, max_rows, max_cost):
+    """Split rows into consecutive (start, stop) blocks of at most `max_rows` rows and about `max_cost` cost"""
+    start, total = 0, 0
+    for row, cost in enumerate(costs):
+        if row > start and (row - start >= max_rows or total + cost > max_cost):
+            yield start, row
+            start, total = row, 0
+        total += cost
+    if start < len(costs):
+        yield start, len(costs)
+
+def _block_product(matrix, transposed, start, stop, count):
+    """Rows start..stop of matrix @ matrix.T as a dense array, summed over the postings of shared columns"""
+    import numpy as np
+
+    indptr, indices, data = matrix
+    column_indptr, column_rows, column_data = transposed
+
+    entries = slice(indptr[start], indptr[stop])
+    entry_rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+    entry_columns, entry_values = indices[entries], data[entries]
+
+    # Every (entry, posting of its column) pair, found without a Python loop
+    lengths = column_indptr[entry_columns + 1] - column_indptr[entry_columns]
+    first = np.repeat(column_indptr[entry_columns] - (np.cumsum(lengths) - lengths), lengths)
+    postings = first + np.arange(lengths.sum())
+
+    keys = np.repeat(entry_rows, lengths) * count + column_rows[postings]
+    weights = np.repeat(entry_values, lengths) * column_data[postings]
+    products = np.bincount(keys, weights=weights, minlength=(stop - start) * count)
+    return products.astype(float, copy=False).reshape(stop - start, count)  # (an empty bincount is integer)
+
+def _top_columns(scores, top):
+    """[(column, score)] of the `top` highest positive scores, ties in column order (as in _rank_python)"""
+    import numpy as np
+
+    if top < len(scores):
+        threshold = scores[np.argpartition(-scores, top - 1)[top - 1]]
+        candidates = np.flatnonzero((scores >= threshold) & (scores > 0))
+    else:
+        candidates = np.flatnonzero(scores > 0)
+    best = candidates[np.lexsort((candidates, -scores[candidates]))][:top]
+    return [(int(column), float(scores[column])) for column in best]
+
+class RelatedPosts:
+    """
+    Similarity of every post to every other post, from their tags and text.
+
+    The score of a pair is TAG_WEIGHT times the Jaccard index of their tags,
+    plus the rest times the cosine similarity of their TF-IDF vectors.
+    Weights are (1 + log tf) * log(N / df) over the title and body (see
+    term_vector). Only the MAX_TERMS highest-weighted terms of each post are
+    compared: they carry most of the similarity, and leaving out the rest
+    keeps frequent words from making every pair of posts interact. The norm
+    is still that of the whole vector.
+
+    Term vectors are cached on disk (shared with the search index), so a
+    build only tokenizes new or edited posts, and `add`/`remove` update a
+    single post for the dev server.
+
+    Since IDF depends on every post, the scores themselves are recomputed in
+    one pass: a sparse matrix product with NumPy, or an accumulation over the
+    postings of shared terms and tags without it. Both give the same result.
+    Only terms and tags found in at least two posts can contribute to a pair,
+    so the others are left out of the product. With NumPy, scores are
+    computed for a block of rows at a time and only the best `top` of each
+    row are kept, so memory does not grow with the square of the post count.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.documents = {}
+
+    @classmethod
+    def from_posts(cls, posts, cache=None):
+        related = cls(cache)
+        for post in posts:
+            related.add(post)
+        return related
+
+    def add(self, post):
+        """Vectorize (or re-vectorize) a post"""
+        self.documents[post['url']] = {
+            'date': post['date'].isoformat(),
+            'tags': post_tags(post),
+            'terms': term_vector(post, self.cache)
+        }
+
+    def remove(self, url):
+        self.documents.pop(url, None)
+
+    def document_order(self):
+        """Newest first, which also breaks ties between equal scores"""
+        return sorted(self.documents, key=lambda url: (self.documents[url]['date'], url), reverse=True)
+
+    def weighted_vectors(self, order):
+        """Return (top TF-IDF terms of each post divided by its norm, {term: posts whose top terms include it})"""
+        document_frequency = Counter(term for url in order for term in self.documents[url]['terms'])
+        count = len(order)
+
+        vectors = []
+        for url in order:
+            weights = {
+                term: (1 + math.log(frequency)) * math.log(count / document_frequency[term])
+                for term, frequency in self.documents[url]['terms'].items()
+            }
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            top = sorted(weights.items(), key=lambda item: (-item[1], item[0]))[:MAX_TERMS]
+            vectors.append({term: weight / norm for term, weight in top if weight})
+        return vectors, Counter(term for vector in vectors for term in vector)
+
+    def related(self, top=DEFAULT_RELATED_POSTS):
+        """Return {post URL: [(related post URL, score), ...]}, best `top` first"""
+        order = self.document_order()
+        vectors, document_frequency = self.weighted_vectors(order)
+        shared_terms = sorted(term for term, frequency in document_frequency.items() if frequency > 1)
+        tag_frequency = Counter(tag for url in order for tag in self.documents[url]['tags'])
+        shared_tags = sorted(tag for tag, frequency in tag_frequency.items() if frequency > 1)
+
+        rank = self._rank_numpy if numpy_available() else self._rank_python
+        ranked = rank(order, vectors, shared_terms, shared_tags, top)
+        return {url: [(order[column], score) for column, score in ranked[row]] for row, url in enumerate(order)}
+
+    def _rank_numpy(self, order, vectors, shared_terms, shared_tags, top):
+        import numpy as np
+
+        count = len(order)
+        text = _sparse_rows(vectors, {term: column for column, term in enumerate(shared_terms)})
+        tags = _sparse_rows(
+            [dict.fromkeys(self.documents[url]['tags'], 1.0) for url in order],
+            {tag: column for column, tag in enumerate(shared_tags)}
+        )
+        text_columns = _transpose(*text, len(shared_terms))
+        tag_columns = _transpose(*tags, len(shared_tags))
+        sizes = np.array([len(self.documents[url]['tags']) for url in order], dtype=float)
+
+        # Each block of rows expands to about SCORE_BLOCK_POSTINGS postings and a rows x posts score matrix
+        costs = _posting_counts(text, text_columns) + _posting_counts(tags, tag_columns)
+        ranked = []
+        for start, stop in _row_blocks(costs, SCORE_BLOCK_ROWS, SCORE_BLOCK_POSTINGS):
+            cosine = _block_product(text, text_columns, start, stop, count)
+            common = _block_product(tags, tag_columns, start, stop, count)
+            union = sizes[start:stop, None] + sizes[None, :] - common
+            jaccard = np.divide(common, union, out=np.zeros_like(common), where=union > 0)
+
+            scores = np.round(TAG_WEIGHT * jaccard + (1 - TAG_WEIGHT) * cosine, SCORE_DIGITS)
+            scores[np.arange(stop - start), np.arange(start, stop)] = 0
+            ranked.extend(_top_columns(row_scores, top) for row_scores in scores)
+        return ranked
+
+    def _rank_python(self, order, vectors, shared_terms, shared_tags, top):
+        def accumulate(postings, totals):
+            for entries in postings.values():
+                for row, weight in entries:
+                    for column, other_weight in entries:
+                        if row != column:
+                            key = (row, column)
+                            totals[key] = totals.get(key, 0.0) + weight * other_weight
+
+        shared_terms, shared_tags = set(shared_terms), set(shared_tags)
+
+        term_postings = {}
+        tag_postings = {}
+        for row, (url, vector) in enumerate(zip(order, vectors)):
+            for term, weight in vector.items():
+                if term in shared_terms:
+                    term_postings.setdefault(term, []).append((row, weight))
+            for tag in self.documents[url]['tags']:
+                if tag in shared_tags:
+                    tag_postings.setdefault(tag, []).append((row, 1.0))
+
+        cosine = {}
+        common = {}
+        accumulate(term_postings, cosine)
+        accumulate(tag_postings, common)
+
+        pairs = {}
+        for key in cosine.keys() | common.keys():
+            row, column = key
+            jaccard = 0.0
+            if key in common:
+                union = len(self.documents[order[row]]['tags']) + len(self.documents[order[column]]['tags']) - common[key]
+                jaccard = common[key] / union
+            score = round(TAG_WEIGHT * jaccard + (1 - TAG_WEIGHT) * cosine.get(key, 0.0), SCORE_DIGITS)
+            if score > 0:
+                pairs.setdefault(row, {})[column] = score
+
+        return [
+            sorted(pairs.get(row, {}).items(), key=lambda item: (-item[1], item[0]))[:top]
+            for row in range(len(order))
+        ]
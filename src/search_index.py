@@ -0,0 +1,193 @@
+"""
+search_index.py - Post index, per-post content shards and the sharded full-text search index
+"""
+
+import re
+import html
+import json
+from collections import Counter
+from pathlib import Path
+
+from src.utils import hash_data
+
+INDEX_FILE = "index.json"   # at the root of the output
+SHARD_FILE = "content.json"  # next to each post's index.html
+INDEX_VERSION = 1
+TERMS_VERSION = 1            # bump when tokenization changes (invalidates cached term vectors)
+
+SEARCH_DIR = "search"        # term shards and metadata of the full-text index
+SEARCH_META_FILE = "meta.json"
+SEARCH_PREFIX_LENGTH = 2     # terms are sharded by their first characters
+OTHER_SHARD = "_"            # shard of terms whose prefix is not [a-z0-9]
+MIN_TERM_LENGTH = 2
+STOPWORDS = frozenset(
+    "an and are as at be but by can do for from has have how if in into is it its no not of on or so than that "
+    "the their then there these they this to was we were what when which while who will with you your".split()
+)
+
+BLOCK_LATEX_PATTERN = re.compile(r'(?<!\\)\$\$(.*?)(?<!\\)\$\$', re.DOTALL)
+INLINE_LATEX_PATTERN = re.compile(r'(?<!\\)\$(.*?)(?<!\\)\$')
+TAG_PATTERN = re.compile(r'<[^>]+>')
+TERM_PATTERN = re.compile(r'[^\W_]+')
+SHARD_PREFIX_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def dump_json(data):
+    """Minified JSON (no indentation or spaces, non-ASCII kept as is)"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def shard_url(post):
+    return f"{post['url']}{SHARD_FILE}"
+
+def shard_path(post):
+    return Path(post['output_path']).parent / SHARD_FILE
+
+def post_entry(post):
+    """Metadata of a post as listed in the index"""
+    return {
+        'title': post['title'],
+        'url': post['url'],
+        'date': post['date'].isoformat(),
+        'tags': post['metadata'].get('tags', []) or [],
+        'content': shard_url(post)
+    }
+
+def render_index(posts):
+    """The metadata index of every post (newest first), without any content"""
+    return dump_json({
+        'version': INDEX_VERSION,
+        'posts': [post_entry(post) for post in posts],
+        'search': f"/{SEARCH_DIR}/{SEARCH_META_FILE}"
+    })
+
+def render_shard(post):
+    """The content shard of a post: its metadata and rendered HTML"""
+    return dump_json({**post_entry(post), 'html': post['content']})
+
+def index_outputs(content, public_dir):
+    """List the index and shard files of a site as (output path, text)"""
+    outputs = [(Path(public_dir) / INDEX_FILE, render_index(content['posts']))]
+    outputs.extend((shard_path(post), render_shard(post)) for post in content['posts'])
+    return outputs
+
+def tokenize(text):
+    """Split rendered HTML into lowercase search terms (LaTeX, tags and stopwords dropped)"""
+    text = BLOCK_LATEX_PATTERN.sub(" ", text)
+    text = INLINE_LATEX_PATTERN.sub(" ", text)
+    text = html.unescape(TAG_PATTERN.sub(" ", text))
+    return [
+        term for term in TERM_PATTERN.findall(text.lower())
+        if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS
+    ]
+
+def term_vector(post, cache=None):
+    """
+    Term frequencies of a post's title and body.
+
+    With a `DiskCache`, vectors are cached by the post's content digest (see
+    page.py) when it has one, so cached posts are never rendered, or else by
+    the hash of the HTML.
+    """
+    if cache is not None:
+        body = {'digest': post['content_digest']} if 'content_digest' in post else {'html': post['content']}
+        key = hash_data({'title': post['title'], **body, 'terms': TERMS_VERSION})
+        cached = cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+
+        vector = term_vector(post)
+        cache.set(key, json.dumps(vector).encode('utf-8'))
+        return vector
+
+    return dict(Counter(tokenize(post['title']) + tokenize(post['content'])))
+
+def shard_prefix(term):
+    """Name of the shard holding a term (clients apply the same rule to find it)"""
+    prefix = term[:SEARCH_PREFIX_LENGTH]
+    return prefix if SHARD_PREFIX_PATTERN.fullmatch(prefix) else OTHER_SHARD
+
+class SearchIndex:
+    """
+    Inverted full-text index of the posts: term -> [[document id, term frequency], ...].
+
+    Documents are numbered oldest first (so publishing a new post does not
+    renumber the existing ones) and listed in search/meta.json with their URL
+    and length in terms. Postings are split into search/<prefix>.json shards
+    by the first characters of the term, so a client only fetches the shards
+    of the terms it looks up.
+
+    Term frequencies are kept per document: `add` and `remove` update a single
+    post, and `changed_outputs` only returns the files whose text changed since
+    the previous call, which lets the dev server rewrite just those. With a
+    `cache`, term vectors are shared with the related posts (see term_vector).
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.documents = {}
+        self.written = {}
+
+    @classmethod
+    def from_posts(cls, posts, cache=None):
+        index = cls(cache)
+        for post in posts:
+            index.add(post)
+        return index
+
+    def add(self, post):
+        """Index (or re-index) a post"""
+        terms = term_vector(post, self.cache)
+        self.documents[post['url']] = {
+            'date': post['date'].isoformat(),
+            'terms': terms,
+            'length': sum(terms.values())
+        }
+
+    def remove(self, url):
+        self.documents.pop(url, None)
+
+    def document_order(self):
+        return sorted(self.documents, key=lambda url: (self.documents[url]['date'], url))
+
+    def shards(self):
+        """Return {prefix: {term: postings}} with postings sorted by document id"""
+        shards = {}
+        for doc_id, url in enumerate(self.document_order()):
+            for term, frequency in self.documents[url]['terms'].items():
+                postings = shards.setdefault(shard_prefix(term), {}).setdefault(term, [])
+                postings.append([doc_id, frequency])
+        return shards
+
+    def outputs(self, public_dir):
+        """List the metadata and shard files of the index as (output path, text)"""
+        search_dir = Path(public_dir) / SEARCH_DIR
+        order = self.document_order()
+        shards = self.shards()
+
+        meta = {
+            'version': INDEX_VERSION,
+            'documents': order,
+            'lengths': [self.documents[url]['length'] for url in order],
+            'prefix_length': SEARCH_PREFIX_LENGTH,
+            'other_shard': OTHER_SHARD,
+            'shards': sorted(shards)
+        }
+
+        outputs = [(search_dir / SEARCH_META_FILE, dump_json(meta))]
+        outputs.extend(
+            (search_dir / f"{prefix}.json", dump_json(dict(sorted(terms.items()))))
+            for prefix, terms in sorted(shards.items())
+        )
+        return outputs
+
+    def changed_outputs(self, public_dir):
+        """Return (outputs whose text changed since the last call, paths not produced anymore)"""
+        outputs = self.outputs(public_dir)
+        current = {str(output_path): text for output_path, text in outputs}
+
+        changed = [(output_path, text) for output_path, text in outputs
+                   if self.written.get(str(output_path)) != text]
+        removed = [Path(output_path) for output_path in self.written if output_path not in current]
+
+        self.written = current
+        return changed, removed
@@ -5,12 +5,21 @@ serve.py - A development server that watches for changes and rebuilds site
 
 import os
 import time
+import argparse
 from watchdog.events import FileSystemEventHandler
-from livereload import Server
 from pathlib import Path
 
-from src.build import build_site, CONTENT_DIR, TEMPLATES_DIR, PUBLIC_DIR, CONFIG_FILE
-from src.utils import load_config
+from src.build import (
+    build_site, build_in_memory, create_environment, sync_content, load_page, is_content_file, collect_content,
+    build_context, site_outputs, render_templates, apply_image_variants, apply_related_posts, related_posts_count,
+    CONTENT_DIR, TEMPLATES_DIR, PUBLIC_DIR, CONFIG_FILE, IMAGE_CACHE_DIR, IMAGE_CACHE_SIZE
+)
+from src.cache import DiskCache
+from src.images import optimize_images, RASTER_SUFFIXES
+from src.manifest import template_closure
+from src.memory import MemoryStore, create_app
+from src.search_index import render_index, render_shard, shard_path, INDEX_FILE
+from src.utils import load_config, generate_sitemap, render_sitemap, transfer_file, ensure_dir, write_file, slugify
 
 
 class ChangeHandler(FileSystemEventHandler):
@@ -35,6 +44,252 @@ class ChangeHandler(FileSystemEventHandler):
         print(f"Change detected: {event.src_path}")
         self.callback()
 
+class DevSite:
+    """
+    Keep the last build in memory and rebuild only what a changed path affects.
+
+    - A content page edit re-renders that page; listings and tag pages that
+      include it are re-rendered only when what they show (title, date, URL,
+      metadata) changed, and everything is re-rendered when the nav changed.
+    - A template edit re-renders the outputs whose template closure includes it.
+    - A static or content asset edit copies just that file.
+    - A site.toml edit (or an unknown change) runs a full incremental build.
+
+    One Jinja environment is kept for the whole session: unchanged templates
+    stay compiled in memory and a changed template is recompiled on its next
+    lookup (auto_reload), including after a full rebuild.
+
+    With a `store` (see memory.py), outputs are kept in memory instead of being
+    written to public/ and assets are served from their source location.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.env = create_environment()
+        self.full_rebuild()
+
+    def full_rebuild(self):
+        if self.store is not None:
+            self.state = build_in_memory(self.store, env=self.env)
+        else:
+            self.state = build_site(incremental=True, env=self.env, staged=False)
+
+    def handle_changes(self, changed_paths=None):
+        """Dispatch changed paths (None when the watcher cannot tell) to targeted rebuilds"""
+        start_time = time.perf_counter()
+
+        if not changed_paths:
+            self.full_rebuild()
+            return
+
+        config = self.state['config']
+        sync_path = config.get("sync", {}).get("path")
+        sync_root = Path(sync_path).expanduser().resolve() if sync_path else None
+
+        rendered = 0
+        for changed_path in changed_paths:
+            path = Path(changed_path)
+            print(f"Change detected: {path}")
+
+            if path == Path(CONFIG_FILE):
+                self.full_rebuild()
+                return
+            elif sync_root and sync_root in path.resolve().parents:
+                rendered += self.sync_external()
+            elif path.is_relative_to(TEMPLATES_DIR):
+                rendered += self.update_template(path)
+            elif path.is_relative_to("static"):
+                self.copy_asset(path, Path("static"))
+            elif path.is_relative_to(CONTENT_DIR) and path.suffix == ".md":
+                rendered += self.update_page(path)
+            elif path.is_relative_to(CONTENT_DIR):
+                self.copy_asset(path, Path(CONTENT_DIR))
+
+        print(f"Rebuilt {rendered} outputs in {time.perf_counter() - start_time:.3f}s")
+
+    def render(self, outputs):
+        """Render and write (template name, overrides, output path, source) outputs"""
+        jobs = [(template_name, overrides, output_path) for template_name, overrides, output_path, _ in outputs]
+        for output_path, html in render_templates(self.state['env'], self.state['context'], jobs):
+            self.write(output_path, html)
+        return len(jobs)
+
+    def write(self, output_path, content):
+        """Write an output to the store or to disk"""
+        if self.store is not None:
+            self.store.write(output_path, content)
+        else:
+            write_file(output_path, content)
+
+    def remove(self, output_path):
+        """Delete an output that is not produced anymore"""
+        if self.store is not None:
+            self.store.remove(output_path)
+            return
+
+        output_path = Path(output_path)
+        if output_path.exists():
+            output_path.unlink()
+            if not any(output_path.parent.iterdir()):
+                output_path.parent.rmdir()
+
+    def update_template(self, path):
+        """Re-render the outputs whose templates include a changed template"""
+        name = path.relative_to(TEMPLATES_DIR).as_posix()
+        env = self.state['env']
+
+        closures = {}
+        affected = []
+        for output in site_outputs(env, self.state['config'], self.state['content']):
+            template_name = output[0]
+            if template_name not in closures:
+                closures[template_name] = template_closure(env, template_name)[0]
+            if name in closures[template_name]:
+                affected.append(output)
+
+        return self.render(affected)
+
+    def copy_asset(self, path, source_root):
+        """Mirror a single static or content asset into the output"""
+        if self.store is not None:
+            return  # Served straight from the source directory
+
+        dest_path = Path(PUBLIC_DIR) / path.relative_to(source_root)
+
+        if not path.exists():
+            if dest_path.exists():
+                dest_path.unlink()
+            return
+
+        ensure_dir(dest_path.parent)
+        transfer_file(path, dest_path)
+
+        if source_root == Path(CONTENT_DIR) and path.suffix.lower() in RASTER_SUFFIXES:
+            image_cache = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_SIZE)
+            self.state['image_variants'].update(optimize_images([dest_path], image_cache))
+
+    def sync_external(self):
+        """Re-run the (incremental) external sync and update the pages it touched"""
+        post_dirs = sync_content(self.state['config']) or {}
+
+        rendered = 0
+        for change in ('added', 'changed', 'deleted'):
+            for post_dir in post_dirs.get(change, []):
+                rendered += self.update_page(Path(post_dir) / "index.md")
+        return rendered
+
+    def update_page(self, md_file):
+        """Reload one content page and re-render the outputs that show it"""
+        config = self.state['config']
+        env = self.state['env']
+        old_content = self.state['content']
+
+        pages = list(old_content['pages'])
+        index = next((i for i, page in enumerate(pages) if page['source_path'] == md_file), None)
+        old_page = pages[index] if index is not None else None
+
+        new_page = None
+        if md_file.exists() and is_content_file(md_file):
+            new_page = load_page(md_file, self.state['markdown_cache'])
+            apply_image_variants(new_page, self.state['image_variants'])
+
+        if old_page is None and new_page is None:
+            return 0
+
+        if new_page is None:
+            pages.pop(index)
+        elif old_page is None:
+            pages.append(new_page)
+        else:
+            pages[index] = new_page
+
+        content = collect_content(pages)
+
+        # Re-vectorize just this post; the related lists of other posts may change with it
+        related_changed = set()
+        related_posts = self.state['related_posts']
+        if related_posts is not None and (new_page or old_page)['is_post']:
+            if old_page is not None:
+                related_posts.remove(old_page['url'])
+            if new_page is not None:
+                related_posts.add(new_page)
+
+            previous = {post['url']: post.get('related') for post in content['posts']}
+            apply_related_posts(content, related_posts, related_posts_count(config))
+            related_changed = {
+                post['output_path'] for post in content['posts'] if post.get('related') != previous[post['url']]
+            }
+
+        self.state['content'] = content
+        self.state['context'] = build_context(config, content)
+
+        old_outputs = {output[2] for output in site_outputs(env, config, old_content)}
+        outputs = list(site_outputs(env, config, content))
+
+        # Drop outputs that are not produced anymore (removed page, fewer listing pages, unused tag)
+        for output_path in old_outputs - {output[2] for output in outputs}:
+            self.remove(output_path)
+
+        # Keep the post index and the post's content shard in sync
+        if (new_page or old_page)['is_post']:
+            self.update_index(old_page, new_page, content)
+
+        if content['nav'] != old_content['nav']:
+            return self.render(outputs)
+
+        affected = set(related_changed)
+        if new_page is not None:
+            affected.add(new_page['output_path'])
+
+        def listing_key(page):
+            if page is None:
+                return None
+            return page['title'], page['date'], page['url'], page['section'], repr(page['metadata'])
+
+        changed = new_page or old_page
+        if changed['is_post'] and listing_key(old_page) != listing_key(new_page):
+            sections = {page['section'] for page in (old_page, new_page) if page}
+            tag_slugs = {
+                slugify(tag) for page in (old_page, new_page) if page
+                for tag in page['metadata'].get('tags', []) or []
+            }
+
+            for _, overrides, output_path, _ in outputs:
+                listing = overrides.get('page', {})
+                if listing.get('is_tag_page'):
+                    if listing['tag_slug'] in tag_slugs:
+                        affected.add(output_path)
+                elif 'section_posts' in overrides and listing.get('section') in sections:
+                    affected.add(output_path)
+
+            if self.store is not None:
+                self.store.write(Path(PUBLIC_DIR) / "sitemap.xml", render_sitemap(content['pages'], config))
+            else:
+                print(f"Sitemap generated at {generate_sitemap(content['pages'], config, PUBLIC_DIR)}")
+
+        return self.render([output for output in outputs if output[2] in affected])
+
+    def update_index(self, old_page, new_page, content):
+        """Update the post index, content shard and search shards of a changed post"""
+        if old_page is not None and (new_page is None or shard_path(old_page) != shard_path(new_page)):
+            self.remove(shard_path(old_page))
+        if new_page is not None:
+            self.write(shard_path(new_page), render_shard(new_page))
+        self.write(Path(PUBLIC_DIR) / INDEX_FILE, render_index(content['posts']))
+
+        # Re-index just this post and rewrite the search shards whose postings changed
+        search_index = self.state['search_index']
+        if old_page is not None:
+            search_index.remove(old_page['url'])
+        if new_page is not None:
+            search_index.add(new_page)
+
+        changed, removed = search_index.changed_outputs(PUBLIC_DIR)
+        for output_path, text in changed:
+            self.write(output_path, text)
+        for output_path in removed:
+            self.remove(output_path)
+
 def get_watch_directories(config):
     """Get directories to watch based on configuration"""
     watch_dirs = []
@@ -75,39 +330,58 @@ def get_server_config(config):
     return {
         "port": server_config.get("port", 8000),
         "host": server_config.get("host", "localhost"),
-        "open_browser": server_config.get("open_browser", True)
+        "open_browser": server_config.get("open_browser", True),
+        "in_memory": server_config.get("in_memory", False)
     }
 
-def start_livereload_server():
+def start_livereload_server(in_memory=False):
     """Start the livereload server"""
+    # livereload brings in tornado, which is only needed once the server actually starts
+    from livereload import Server
+
     config = load_config(CONFIG_FILE)
+    server_cfg = get_server_config(config)
+    in_memory = in_memory or server_cfg['in_memory']
 
-    # First build the site
-    build_site()
+    # First build the site (into memory, or to public/)
+    store = MemoryStore(PUBLIC_DIR) if in_memory else None
+    site = DevSite(store)
 
-    # Create livereload server
-    server = Server()
+    # Create livereload server; in memory mode it serves rendered pages from the store
+    # and falls back to the source assets (content wins over static, as in a build)
+    if in_memory:
+        server = Server(app=create_app(store, [CONTENT_DIR, "static"]))
+    else:
+        server = Server()
 
-    # Watch directories for changes
+    # Watch directories for changes; glob patterns make livereload pass the changed files along
     for watch_dir in get_watch_directories(config):
-        if os.path.exists(watch_dir):
-            server.watch(watch_dir, lambda: build_site())
-
-    server_cfg = get_server_config(config)
+        if os.path.isdir(watch_dir):
+            server.watch(os.path.join(watch_dir, "**", "*"), site.handle_changes)
+        elif os.path.exists(watch_dir):
+            server.watch(watch_dir, site.full_rebuild)
 
     # Serve the site
     open_delay = 1 if server_cfg['open_browser'] else None
     server.serve(
-        root=PUBLIC_DIR,
+        root=None if in_memory else PUBLIC_DIR,
         port=server_cfg['port'],
         host=server_cfg['host'],
-        open_url_delay=open_delay
+        open_url_delay=open_delay,
+        debug=False
     )
 
 def main():
+    parser = argparse.ArgumentParser(description="Serve the site with live reload")
+    parser.add_argument(
+        "--in-memory", action="store_true",
+        help="keep rendered pages in memory and serve assets from their source (nothing is written to public/)"
+    )
+    args = parser.parse_args()
+
     try:
         print("Starting development server...")
-        start_livereload_server()
+        start_livereload_server(in_memory=args.in_memory)
     except KeyboardInterrupt:
         print("\nShutting down server...")
 
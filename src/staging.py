@@ -0,0 +1,103 @@
+"""
+staging.py - Build into a staging directory and publish it with an atomic swap
+"""
+
+import os
+import shutil
+import filecmp
+from pathlib import Path
+
+from src.utils import ensure_dir, transfer_file
+
+RENAME_EXCHANGE = 2  # renameat2() flag: atomically exchange two paths (Linux 3.15+)
+AT_FDCWD = -100
+
+
+def clone_tree(source_dir, target_dir):
+    """
+    Mirror a directory as hardlinks (copies where hardlinks are not supported).
+
+    Writers replace files instead of writing through them (see write_file and
+    transfer_file), so changing the clone never touches the original.
+    """
+    source_dir = Path(source_dir)
+    for dirpath, _, filenames in os.walk(source_dir):
+        target = Path(target_dir) / Path(dirpath).relative_to(source_dir)
+        ensure_dir(target)
+        for filename in filenames:
+            transfer_file(Path(dirpath) / filename, target / filename, "hardlink")
+
+def list_files(root):
+    """Every file under `root`, as paths relative to it"""
+    root = Path(root)
+    return {
+        Path(dirpath, filename).relative_to(root)
+        for dirpath, _, filenames in os.walk(root)
+        for filename in filenames
+    }
+
+def restore_unchanged(previous_dir, staged_dir):
+    """
+    Compare a staged build with the previous output, file by file.
+
+    A staged file with the same bytes as its previous version is replaced by
+    (a hardlink to) the previous file, so it keeps its mtime and inode no matter
+    how it was produced and rsync or hash-based deploys see no change. Returns
+    {'new': n, 'changed': n, 'removed': n, 'unchanged': n}.
+    """
+    previous_dir, staged_dir = Path(previous_dir), Path(staged_dir)
+    previous_files = list_files(previous_dir) if previous_dir.is_dir() else set()
+    staged_files = list_files(staged_dir)
+
+    counts = {'new': 0, 'changed': 0, 'removed': len(previous_files - staged_files), 'unchanged': 0}
+    for relative in staged_files:
+        if relative not in previous_files:
+            counts['new'] += 1
+            continue
+
+        previous, staged = previous_dir / relative, staged_dir / relative
+        if os.path.samefile(previous, staged):
+            counts['unchanged'] += 1
+        elif filecmp.cmp(previous, staged, shallow=False):
+            transfer_file(previous, staged, "hardlink")
+            counts['unchanged'] += 1
+        else:
+            counts['changed'] += 1
+
+    return counts
+
+def exchange_paths(first, second):
+    """Atomically swap two paths with renameat2(RENAME_EXCHANGE); False where that is unavailable"""
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):
+        return False
+
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    return renameat2(AT_FDCWD, os.fsencode(first), AT_FDCWD, os.fsencode(second), RENAME_EXCHANGE) == 0
+
+def publish(staged_dir, output_dir):
+    """
+    Replace `output_dir` with `staged_dir`.
+
+    Where the platform can exchange two directories atomically, readers see
+    either the old or the new output, never a mix; otherwise the output is
+    missing only between two renames. The previous output is deleted.
+    """
+    staged_dir, output_dir = Path(staged_dir), Path(output_dir)
+
+    if not output_dir.exists():
+        os.rename(staged_dir, output_dir)
+        return
+
+    if exchange_paths(staged_dir, output_dir):
+        shutil.rmtree(staged_dir)
+        return
+
+    previous_dir = output_dir.with_name(output_dir.name + ".old")
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    os.rename(output_dir, previous_dir)
+    os.rename(staged_dir, output_dir)
+    shutil.rmtree(previous_dir)
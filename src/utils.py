@@ -1,14 +1,20 @@
-import markdown
 import re
+import os
+import sys
+import json
+import mmap
+import hashlib
+import tempfile
 from pathlib import Path
 from datetime import datetime
-import tomli
 import shutil
 
 # ===============
 # Basic Utilities
 # ===============
 
+MMAP_THRESHOLD = 8 * 1024 * 1024  # bytes
+
 def slugify(text):
     """Convert text to URL-friendly slug"""
     text = text.lower()
@@ -18,6 +24,8 @@ def slugify(text):
 
 def load_config(file_path):
     """Load configuration from a TOML file"""
+    import tomli
+
     try:
         with open(file_path, "rb") as f:
             return tomli.load(f)
@@ -28,13 +36,112 @@ def ensure_dir(directory):
     """Ensure directory exists"""
     Path(directory).mkdir(parents=True, exist_ok=True)
 
-def copy_files(source_dir, target_dir, pattern="**/*", exclude_patterns=None):
-    """Generic file copy utility"""
+def write_file(path, content):
+    """
+    Write text (or bytes) content to a file, creating parent directories as needed.
+
+    The file is replaced rather than overwritten in place, so an output that is
+    a hardlink to a source file never modifies the source.
+    """
+    path = Path(path)
+    ensure_dir(path.parent)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file's contents, streaming so memory stays flat"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            # Large files are hashed straight from the page cache
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_data(data, default=str):
+    """Return a stable SHA-256 hex digest of JSON-serializable data (`default` serializes anything else)"""
+    serialized = json.dumps(data, sort_keys=True, default=default)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+LINK_MODES = ("copy", "hardlink", "reflink")
+FICLONE = 0x40049409  # Linux ioctl to share extents between files (btrfs, XFS, ...)
+
+def files_match(source, dest):
+    """Check whether dest already mirrors source (same file, or same size and mtime)"""
+    try:
+        source_stat = os.stat(source)
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return False
+
+    if (source_stat.st_dev, source_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+        return True
+    return source_stat.st_size == dest_stat.st_size and source_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+def reflink_file(source, dest):
+    """Clone a file's extents (copy-on-write), raises OSError when unsupported"""
+    if not sys.platform.startswith('linux'):
+        raise OSError("reflinks are only supported on Linux")
+
+    import fcntl
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, dest)
+
+def transfer_file(source, dest, link_mode="copy"):
+    """Copy, hardlink or reflink a file, falling back to a plain copy"""
+    # Never write through an existing destination (it may be a hardlink to a source)
+    if os.path.lexists(dest):
+        os.unlink(dest)
+
+    if link_mode == "hardlink":
+        try:
+            os.link(source, dest)
+            return
+        except OSError:
+            pass  # e.g. different filesystems
+    elif link_mode == "reflink":
+        try:
+            reflink_file(source, dest)
+            return
+        except OSError:
+            if os.path.exists(dest):
+                os.unlink(dest)
+
+    shutil.copy2(source, dest)
+
+def copy_files(source_dir, target_dir, pattern="**/*", exclude_patterns=None, link_mode="copy", workers=None):
+    """
+    Generic file copy utility, returns the list of destination paths.
+
+    Files whose destination already matches (same size and mtime, or the same
+    inode) are skipped. `link_mode` selects plain copies, hardlinks or reflinks
+    (falling back to copying when linking is not possible), and the remaining
+    transfers run on a pool of `workers` threads.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode '{link_mode}', expected one of {', '.join(LINK_MODES)}")
+
     exclude_patterns = exclude_patterns or []
     source_path = Path(source_dir)
+    copied = []
+    pending = []
 
     if not source_path.exists():
-        return False
+        return copied
 
     for item in source_path.glob(pattern):
         # Skip directories
@@ -48,14 +155,27 @@ def copy_files(source_dir, target_dir, pattern="**/*", exclude_patterns=None):
         # Determine destination path
         rel_path = item.relative_to(source_path)
         dest_path = Path(target_dir) / rel_path
+        copied.append(dest_path)
+
+        # Skip files that are already up to date
+        if files_match(item, dest_path):
+            continue
 
         # Create parent directories
         ensure_dir(dest_path.parent)
+        pending.append((item, dest_path))
 
-        # Copy the file
-        shutil.copy2(item, dest_path)
+    # Copy the files (I/O bound, so threads overlap the system calls)
+    if len(pending) > 1 and workers != 1:
+        from concurrent.futures import ThreadPoolExecutor
 
-    return True
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda job: transfer_file(*job, link_mode), pending))
+    else:
+        for item, dest_path in pending:
+            transfer_file(item, dest_path, link_mode)
+
+    return copied
 
 # ==================
 # Content Processing
@@ -76,91 +196,83 @@ def generate_url(rel_path, output_dir, is_index, is_content_index, slug):
         else:  # nested page
             return f"/{rel_path}/{slug}/", Path(output_dir) / rel_path / slug / "index.html"
 
-def render_markdown(text):
-    """
-    Render markdown text to HTML with custom handling for:
-    1. LaTeX blocks (preserved for later JS rendering)
-    2. Custom image syntax with size specifications: ![alt|width](src)
+MARKDOWN_RENDERER_VERSION = 2  # bump when the output of render_markdown changes (invalidates the cache)
+MARKDOWN_EXTENSIONS = ['fenced_code', 'codehilite', 'tables', 'md_in_html']
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {
+        'css_class': 'code-block',  # custom CSS class (in /static/code.css)
+    }
+}
+
+def markdown_cache_key(text):
+    """Cache key for rendered markdown: the text, the renderer and extension setup and the library versions"""
+    import markdown
+    import pygments
+
+    return hash_data({
+        'text': text,
+        'renderer': MARKDOWN_RENDERER_VERSION,
+        'extensions': MARKDOWN_EXTENSIONS,
+        'extension_configs': MARKDOWN_EXTENSION_CONFIGS,
+        'markdown': markdown.__version__,
+        'pygments': pygments.__version__
+    })
+
+def paginate(posts, per_page, base_url, output_dir):
     """
+    Split an already-sorted list of posts into listing pages.
 
-    # Store LaTeX parts
-    placeholders = {}
-    count = 0
-
-    # Handle block LaTeX ($$...$$)
-    def replace_block(match):
-        nonlocal count
-        placeholder = f"LATEX_BLOCK_{count}_"
-        placeholders[placeholder] = match.group(0)
-        count += 1
-        return placeholder
-
-    text = re.sub(r'(?<!\\)\$\$(.*?)(?<!\\)\$\$', replace_block, text, flags=re.DOTALL)
-
-    # Handle inline LaTeX ($...$)
-    def replace_inline(match):
-        nonlocal count
-        placeholder = f"LATEX_INLINE_{count}_"
-        placeholders[placeholder] = match.group(0)
-        count += 1
-        return placeholder
-
-    text = re.sub(r'(?<!\\)\$(.*?)(?<!\\)\$', replace_inline, text)
-
-    # Process custom image syntax: ![alt|width](src)
-    def process_images(match):
-        alt_width = match.group(1)
-        src = match.group(2)
-
-        # Check if there's a width specification
-        if '|' in alt_width:
-            alt, width = alt_width.rsplit('|', 1)
-            # Try to parse width as number (strip 'px' if present)
-            width = width.strip()
-            if width.endswith('px'):
-                width = width[:-2]
-
-            # If width is a valid number, add the width attribute
-            if width.isdigit():
-                return f'![{alt}]({src})<!-- img-width:{width} -->'
-
-        # If no width specification or invalid format, return unchanged
-        return f'![{alt_width}]({src})'
-
-    # Process images with custom syntax
-    text = re.sub(r'!\[(.*?)\]\((.*?)\)', process_images, text)
-
-    # Process with markdown
-    html = markdown.markdown(
-        text,
-        extensions=['fenced_code', 'codehilite', 'tables', 'md_in_html'],
-        extension_configs={
-            'codehilite': {
-                'css_class': 'code-block',  # custom CSS class (in /static/code.css)
-            }
+    The first page lives at `base_url`, the following ones at
+    `{base_url}page/N/`. Yields one dict per page with its slice of posts,
+    URL, output path and the URLs of the previous and next pages.
+    """
+    if not per_page or per_page < 1:
+        per_page = max(len(posts), 1)
+
+    total_pages = max(1, -(-len(posts) // per_page))
+
+    def page_url(number):
+        return base_url if number == 1 else f"{base_url}page/{number}/"
+
+    for number in range(1, total_pages + 1):
+        output_path = Path(output_dir) / "index.html" if number == 1 \
+            else Path(output_dir) / "page" / str(number) / "index.html"
+
+        yield {
+            'posts': posts[(number - 1) * per_page:number * per_page],
+            'number': number,
+            'total_pages': total_pages,
+            'url': page_url(number),
+            'output_path': output_path,
+            'prev_url': page_url(number - 1) if number > 1 else None,
+            'next_url': page_url(number + 1) if number < total_pages else None
         }
-    )
 
-    # Post-process HTML to add width attributes to images
-    def add_image_width(match):
-        img_tag = match.group(1)
-        width = match.group(2)
+def render_markdown(text, cache=None):
+    """
+    Render markdown text to HTML with custom handling for:
+    1. LaTeX blocks (preserved for later JS rendering)
+    2. Custom image syntax with size specifications: ![alt|width](src)
 
-        # If img tag already has a width attribute, don't modify
-        if 'width=' in img_tag:
-            return f'<img {img_tag}>'
+    Both are Markdown extensions of a converter that is reused across calls
+    (see markdown_engine.py).
 
-        # Add width attribute
-        return f'<img {img_tag} width="{width}">'
+    When a `DiskCache` is given, unchanged text is served from the cache.
+    Markdown (and Pygments through codehilite) is only imported on a miss.
+    """
+    if cache is not None:
+        key = markdown_cache_key(text)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.decode('utf-8')
 
-    # Add width attributes to images with comments
-    html = re.sub(r'<img (.*?)><!-- img-width:(\d+) -->', add_image_width, html)
+        html = render_markdown(text)
+        cache.set(key, html.encode('utf-8'))
+        return html
 
-    # Restore LaTeX parts
-    for placeholder, latex in placeholders.items():
-        html = html.replace(placeholder, latex)
+    from src import markdown_engine
 
-    return html
+    return markdown_engine.convert(text, MARKDOWN_EXTENSIONS, MARKDOWN_EXTENSION_CONFIGS)
 
 # ======================
 # External Sync Features
@@ -180,10 +292,52 @@ description: My personal blog posts and thoughts
 
     print(f"  ✓ Created blog index: _index.md")
 
-def process_assets(content, source_file, target_dir, source_type):
-    """Process assets based on the source type"""
+def copy_asset(source_path, assets_dir, known_assets=None):
+    """
+    Copy an asset into a post's assets folder, identified by content hash.
+
+    The asset keeps its original name unless a different file of the same
+    note already claimed it, in which case the name gets a short hash suffix.
+    A copy left by a previous sync under that name is replaced when the
+    attachment changed, so an edited attachment keeps its name from sync to
+    sync. A file already present with the same content is not copied again.
+    `known_assets` maps digests to filenames already placed in `assets_dir`
+    during this sync, so identical files embedded under different names are
+    stored once as well (without it, any different file already in place
+    counts as a claim). Returns the asset filename relative to `assets_dir`.
+    """
+    source_path = Path(source_path)
+    digest = hash_file(source_path)
+
+    if known_assets is not None and digest in known_assets:
+        return known_assets[digest]
+
+    target_path = Path(assets_dir) / source_path.name
+    if known_assets is not None:
+        claimed = target_path.name in known_assets.values()
+    else:
+        claimed = target_path.exists() and hash_file(target_path) != digest
+    if claimed:
+        target_path = target_path.with_name(f"{source_path.stem}-{digest[:8]}{source_path.suffix}")
+
+    if not (target_path.exists() and hash_file(target_path) == digest):
+        ensure_dir(assets_dir)
+        transfer_file(source_path, target_path)
+
+    if known_assets is not None:
+        known_assets[digest] = target_path.name
+    return target_path.name
+
+def process_assets(content, source_file, target_dir, source_type, vault_index=None):
+    """
+    Process assets based on the source type.
+
+    Returns the new content, the list of (source path, asset filename)
+    pairs for the files the content references and the names of the
+    Obsidian embeds that could not be resolved.
+    """
     if source_type == "obsidian":
-        return process_obsidian_assets(content, source_file, target_dir)
+        return process_obsidian_assets(content, source_file, target_dir, vault_index)
     else:  # Default to basic markdown
         return process_markdown_assets(content, source_file, target_dir)
 
@@ -191,7 +345,8 @@ def process_markdown_assets(content, source_file, target_dir):
     """Process standard markdown content to find assets and copy them"""
     source_dir = source_file.parent
     assets_dir = target_dir / "assets"
-    assets_copied = 0
+    assets_copied = []
+    known_assets = {}
 
     # Basic markdown patterns
     asset_patterns = [
@@ -200,8 +355,6 @@ def process_markdown_assets(content, source_file, target_dir):
     ]
 
     def replace_asset_reference(match, pattern_type):
-        nonlocal assets_copied
-
         if pattern_type == 'image':
             alt_text = match.group(1)
             asset_path = match.group(2)
@@ -231,26 +384,10 @@ def process_markdown_assets(content, source_file, target_dir):
             print(f"    Warning: Asset not found: {asset_path}")
             return match.group(0)
 
-        # Copy asset
-        if not assets_dir.exists():
-            ensure_dir(assets_dir)
-
-        asset_filename = full_asset_path.name
-        target_asset_path = assets_dir / asset_filename
-
-        # Handle filename conflicts
-        counter = 1
-        original_stem = full_asset_path.stem
-        original_suffix = full_asset_path.suffix
-
-        while target_asset_path.exists():
-            asset_filename = f"{original_stem}_{counter}{original_suffix}"
-            target_asset_path = assets_dir / asset_filename
-            counter += 1
-
+        # Copy asset (deduplicated by content)
         try:
-            shutil.copy2(full_asset_path, target_asset_path)
-            assets_copied += 1
+            asset_filename = copy_asset(full_asset_path, assets_dir, known_assets)
+            assets_copied.append((full_asset_path, asset_filename))
 
             # Convert to img tag if it's an image
             if pattern_type == 'image':
@@ -265,21 +402,130 @@ def process_markdown_assets(content, source_file, target_dir):
     content = re.sub(asset_patterns[0], lambda m: replace_asset_reference(m, 'image'), content)
     content = re.sub(asset_patterns[1], lambda m: replace_asset_reference(m, 'link'), content)
 
-    return content, assets_copied
+    return content, assets_copied, []
 
-def find_file_in_vault(filename, source_file):
-    """Find a file by name anywhere in the Obsidian vault"""
-    # Get the vault root by finding the directory that contains .obsidian
-    vault_root = None
-    current_dir = source_file.parent
+def find_vault_root(directory):
+    """Walk up the directory tree to find the Obsidian vault root (the directory containing .obsidian)"""
+    current_dir = Path(directory)
 
-    # Walk up the directory tree to find the vault root
     while current_dir != current_dir.parent:
         if (current_dir / '.obsidian').exists():
-            vault_root = current_dir
-            break
+            return current_dir
         current_dir = current_dir.parent
 
+    return None
+
+class VaultIndex:
+    """
+    Filename index of an Obsidian vault, so embeds resolve with dictionary lookups.
+
+    The index keeps, per directory, its mtime and its file/subdirectory names.
+    A directory's mtime only changes when entries are added, removed or renamed,
+    so `refresh()` re-lists just the directories whose mtime moved and reuses
+    the rest (also across builds, via `load()`/`save()`).
+    """
+
+    def __init__(self, root, directories=None):
+        self.root = Path(root)
+        self.directories = directories or {}
+        self.exact = {}
+        self.casefolded = {}
+        self.rescanned = 0
+
+    @classmethod
+    def load(cls, root, index_file):
+        """Load a previously saved index for this vault root (or start empty)"""
+        try:
+            with open(index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls(root)
+
+        if data.get('root') != str(root):
+            return cls(root)
+        return cls(root, data.get('directories', {}))
+
+    def save(self, index_file):
+        """Persist the directory listings for the next sync"""
+        ensure_dir(Path(index_file).parent)
+        tmp_path = f"{index_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'root': str(self.root), 'directories': self.directories}, f, sort_keys=True)
+        os.replace(tmp_path, index_file)
+
+    def refresh(self):
+        """Re-list directories whose mtime changed and rebuild the lookup maps"""
+        directories = {}
+        pending = ['']
+        self.rescanned = 0
+
+        while pending:
+            rel_dir = pending.pop()
+            dir_path = self.root / rel_dir
+
+            try:
+                mtime = dir_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+            entry = self.directories.get(rel_dir)
+            if entry is None or entry['mtime'] != mtime:
+                files = []
+                subdirs = []
+                with os.scandir(dir_path) as entries:
+                    for item in entries:
+                        if item.is_dir(follow_symlinks=False):
+                            # Skip files in .obsidian directory
+                            if item.name != '.obsidian':
+                                subdirs.append(item.name)
+                        elif item.is_file():
+                            files.append(item.name)
+
+                entry = {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(subdirs)}
+                self.rescanned += 1
+
+            directories[rel_dir] = entry
+            pending.extend(f"{rel_dir}/{name}" if rel_dir else name for name in entry['dirs'])
+
+        self.directories = directories
+
+        self.exact = {}
+        self.casefolded = {}
+        for rel_dir in sorted(directories):
+            for name in directories[rel_dir]['files']:
+                file_path = self.root / rel_dir / name
+                self.exact.setdefault(name, []).append(file_path)
+                self.casefolded.setdefault(name.casefold(), []).append(file_path)
+
+    def find(self, filename):
+        """Find a file by name (or trailing path, e.g. `attachments/plot.png`)"""
+        parts = Path(filename).parts
+        if not parts:
+            return None
+
+        for file_path in self.exact.get(parts[-1], []):
+            if file_path.parts[-len(parts):] == parts:
+                return file_path
+
+        # If not found with exact name, try case-insensitive search
+        folded = tuple(part.casefold() for part in parts)
+        for file_path in self.casefolded.get(parts[-1].casefold(), []):
+            if tuple(part.casefold() for part in file_path.parts[-len(parts):]) == folded:
+                return file_path
+
+        return None
+
+    def file_count(self):
+        return sum(len(entry['files']) for entry in self.directories.values())
+
+def find_file_in_vault(filename, source_file, vault_index=None):
+    """Find a file by name anywhere in the Obsidian vault"""
+    if vault_index is not None:
+        return vault_index.find(filename)
+
+    # Get the vault root by finding the directory that contains .obsidian
+    vault_root = find_vault_root(source_file.parent)
+
     # If we can't find .obsidian, use the source file's directory as fallback
     if not vault_root:
         vault_root = source_file.parent
@@ -306,11 +552,13 @@ def find_file_in_vault(filename, source_file):
 
     return None
 
-def process_obsidian_assets(content, source_file, target_dir):
+def process_obsidian_assets(content, source_file, target_dir, vault_index=None):
     """Process Obsidian content with support for ![[]] syntax and vault-wide file search"""
     source_dir = source_file.parent
     assets_dir = target_dir / "assets"
-    assets_copied = 0
+    assets_copied = []
+    known_assets = {}
+    unresolved = []
 
     # Obsidian and standard markdown patterns
     asset_patterns = [
@@ -320,8 +568,6 @@ def process_obsidian_assets(content, source_file, target_dir):
     ]
 
     def replace_asset_reference(match, pattern_type):
-        nonlocal assets_copied
-
         if pattern_type == 'obsidian':
             path_width = match.group(1)
             if '|' in path_width:
@@ -332,9 +578,10 @@ def process_obsidian_assets(content, source_file, target_dir):
                 alt_text = "Image"
 
             # Search for file in vault
-            full_asset_path = find_file_in_vault(asset_path, source_file)
+            full_asset_path = find_file_in_vault(asset_path, source_file, vault_index)
             if not full_asset_path:
                 print(f"    Warning: Obsidian asset not found: {asset_path}")
+                unresolved.append(asset_path)
                 return match.group(0)
 
         elif pattern_type == 'image':
@@ -380,26 +627,10 @@ def process_obsidian_assets(content, source_file, target_dir):
                 print(f"    Warning: Asset not found: {asset_path}")
                 return match.group(0)
 
-        # Copy asset (common logic)
-        if not assets_dir.exists():
-            ensure_dir(assets_dir)
-
-        asset_filename = full_asset_path.name
-        target_asset_path = assets_dir / asset_filename
-
-        # Handle conflicts
-        counter = 1
-        original_stem = full_asset_path.stem
-        original_suffix = full_asset_path.suffix
-
-        while target_asset_path.exists():
-            asset_filename = f"{original_stem}_{counter}{original_suffix}"
-            target_asset_path = assets_dir / asset_filename
-            counter += 1
-
+        # Copy asset (common logic, deduplicated by content)
         try:
-            shutil.copy2(full_asset_path, target_asset_path)
-            assets_copied += 1
+            asset_filename = copy_asset(full_asset_path, assets_dir, known_assets)
+            assets_copied.append((full_asset_path, asset_filename))
 
             if pattern_type == 'obsidian':
                 # Convert to img tag, with width if specified
@@ -422,15 +653,14 @@ def process_obsidian_assets(content, source_file, target_dir):
     content = re.sub(asset_patterns[1], lambda m: replace_asset_reference(m, 'image'), content)
     content = re.sub(asset_patterns[2], lambda m: replace_asset_reference(m, 'link'), content)
 
-    return content, assets_copied
+    return content, assets_copied, unresolved
 
 # =============
 # Miscellaneous
 # =============
 
-def generate_sitemap(pages, config, public_dir):
-    """Generate sitemap.xml for search engines"""
-    sitemap_path = Path(public_dir) / "sitemap.xml"
+def render_sitemap(pages, config):
+    """Render the sitemap.xml document for a list of pages"""
     base_url = config.get("base_url", "")
 
     sitemap = ['<?xml version="1.0" encoding="UTF-8"?>']
@@ -445,10 +675,16 @@ def generate_sitemap(pages, config, public_dir):
 
     sitemap.append('</urlset>')
 
+    return '\n'.join(sitemap)
+
+def generate_sitemap(pages, config, public_dir):
+    """Generate sitemap.xml for search engines, returns its path"""
+    sitemap_path = Path(public_dir) / "sitemap.xml"
+
     with open(sitemap_path, 'w') as f:
-        f.write('\n'.join(sitemap))
+        f.write(render_sitemap(pages, config))
 
-    print(f"Sitemap generated at {sitemap_path}")
+    return sitemap_path
 
 def create_new_post():
     """Create a new blog post with user-provided title"""
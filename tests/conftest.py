@@ -0,0 +1,42 @@
+"""
+conftest.py - Throwaway sites (the repo's templates and static files) for build tests
+"""
+
+import shutil
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SITE_CONFIG = """
+title = "Test site"
+description = "A site built by the tests"
+base_url = "https://example.com"
+language = "en"
+
+[author]
+name = "Tester"
+
+[params]
+posts_per_page = 10
+related_posts = 3
+show_reading_time = true
+date_format = "%B %d, %Y"
+"""
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """An empty site in a temporary directory, which becomes the working directory"""
+    shutil.copytree(REPO_ROOT / "templates", tmp_path / "templates")
+    shutil.copytree(REPO_ROOT / "static", tmp_path / "static")
+    (tmp_path / "site.toml").write_text(SITE_CONFIG, encoding='utf-8')
+
+    blog_dir = tmp_path / "content" / "blog"
+    blog_dir.mkdir(parents=True)
+    (tmp_path / "content" / "_index.md").write_text("---\ntitle: Home\n---\n\nHello.\n", encoding='utf-8')
+    (blog_dir / "_index.md").write_text("---\ntitle: Blog\n---\n", encoding='utf-8')
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
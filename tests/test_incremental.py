@@ -0,0 +1,54 @@
+"""
+test_incremental.py - Incremental builds only re-render the outputs whose inputs changed
+"""
+
+from pathlib import Path
+
+from src import build
+
+def write_post(root, slug, title, date, tags, body):
+    """Write content/blog/<slug>/index.md"""
+    post_dir = root / "content" / "blog" / slug
+    post_dir.mkdir(parents=True, exist_ok=True)
+    path = post_dir / "index.md"
+    path.write_text(f"---\ntitle: {title}\ndate: {date}\ntags: [{', '.join(tags)}]\n---\n\n{body}\n", encoding='utf-8')
+    return path
+
+def build_and_record(monkeypatch):
+    """Run an incremental build, returning the HTML outputs it rendered (relative to public/)"""
+    written = []
+
+    def record(path, content):
+        written.append(Path(path))
+        return write_file(path, content)
+
+    write_file = build.write_file
+    monkeypatch.setattr(build, "write_file", record)
+    build.build_site(incremental=True, optimize=False)
+    monkeypatch.setattr(build, "write_file", write_file)
+
+    staging = Path(build.STAGING_DIR)
+    return sorted(path.relative_to(staging).as_posix() for path in written if path.suffix == ".html")
+
+def test_body_edit_rewrites_only_that_post(site, monkeypatch):
+    post = write_post(site, "first", "First post", "2024-01-01", ["alpha", "beta"], "Matrices and vectors.")
+    write_post(site, "second", "Second post", "2024-02-01", ["alpha"], "Gradients and tensors.")
+    write_post(site, "third", "Third post", "2024-03-01", ["gamma"], "Graphs and trees.")
+
+    assert "blog/first/index.html" in build_and_record(monkeypatch)
+    assert build_and_record(monkeypatch) == []
+
+    post.write_text(post.read_text(encoding='utf-8') + "\nAnother paragraph about matrices.\n", encoding='utf-8')
+    assert build_and_record(monkeypatch) == ["blog/first/index.html"]
+    assert "Another paragraph about matrices." in (site / "public" / "blog" / "first" / "index.html").read_text()
+
+def test_title_edit_rewrites_the_listings(site, monkeypatch):
+    post = write_post(site, "first", "First post", "2024-01-01", ["alpha"], "Matrices and vectors.")
+    write_post(site, "second", "Second post", "2024-02-01", ["beta"], "Gradients and tensors.")
+    build_and_record(monkeypatch)
+
+    post.write_text(post.read_text(encoding='utf-8').replace("First post", "Renamed post"), encoding='utf-8')
+    rendered = build_and_record(monkeypatch)
+    assert "blog/first/index.html" in rendered
+    assert "blog/index.html" in rendered
+    assert "blog/alpha/index.html" in rendered
@@ -0,0 +1,41 @@
+"""
+test_sync.py - Incremental sync of an Obsidian vault into content/blog
+"""
+
+from pathlib import Path
+
+from src.build import sync_content
+
+
+def make_vault(root):
+    """An Obsidian vault with a Blog folder holding one note that embeds a missing attachment"""
+    vault = root / "vault"
+    (vault / ".obsidian").mkdir(parents=True)
+    (vault / "Blog").mkdir()
+    (vault / "Blog" / "Plotting.md").write_text(
+        "---\ntitle: Plotting\ndate: 2024-01-01\n---\n\nA figure:\n\n![[missing.png]]\n", encoding='utf-8'
+    )
+    return vault
+
+def test_attachment_added_after_the_note(site):
+    vault = make_vault(site)
+    config = {'sync': {'path': str(vault / "Blog"), 'type': "obsidian"}}
+    post = site / "content" / "blog" / "plotting" / "index.md"
+
+    sync_content(config)
+    assert "![[missing.png]]" in post.read_text(encoding='utf-8')
+
+    # Unchanged vault: nothing to do
+    assert sync_content(config)['changed'] == []
+
+    (vault / "attachments").mkdir()
+    (vault / "attachments" / "missing.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+
+    assert sync_content(config)['changed'] == [Path("content/blog/plotting")]
+    text = post.read_text(encoding='utf-8')
+    assert "![[missing.png]]" not in text
+    assert 'src="assets/missing.png"' in text
+    assert (post.parent / "assets" / "missing.png").exists()
+
+    # Resolved now, so the next sync leaves it alone
+    assert sync_content(config)['changed'] == []